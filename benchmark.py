@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Parser benchmark suite
+Times each conversion stage on synthetic CWT itineraries of controlled size
+and writes the results as JSON, so runs from different versions can be diffed.
+
+Usage:
+    python benchmark.py                           # default sizes, results in benchmark_results.json
+    python benchmark.py --sizes 10x2 500x200 -n 5 # segments x pages
+    python benchmark.py --baseline old.json       # compare p50 times with an earlier run
+    python benchmark.py --fixtures fixtures/      # also keep the generated PDFs and texts
+    python benchmark.py --backends pypdf2 pypdfium2  # compare PDF text extraction backends
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Segments x pages measured when no sizes are given
+DEFAULT_SIZES = ['1x1', '10x2', '50x10', '200x50', '500x200']
+
+# Timed stages, in pipeline order
+STAGES = ['extract_text', 'parse_flights', 'parse_hotels', 'process_flights', 'to_ical']
+
+# First day of the synthetic trip; segments are spread over the same year
+TRIP_START = date(2026, 1, 5)
+
+SPANISH_WEEKDAYS = ['lu', 'ma', 'mi', 'ju', 'vi', 'sa', 'do']
+SPANISH_MONTH_NAMES = ['ene', 'feb', 'mar', 'abr', 'may', 'jun',
+                       'jul', 'ago', 'sep', 'oct', 'nov', 'dic']
+
+# Route and supplier pools the synthetic itinerary cycles through
+ROUTE = [('SCL', 'Santiago'), ('LIM', 'Lima'), ('BOG', 'Bogota'), ('MEX', 'Mexico'),
+         ('GRU', 'Sao Paulo'), ('EZE', 'Buenos Aires')]
+AIRLINES = [('LAN AIRLINES', 'LA'), ('LATAM AIRLINES', 'LA'), ('AVIANCA', 'AV'),
+            ('COPA AIRLINES', 'CM')]
+HOTELS = [
+    ('CASA ANDINA PREMIUM SAN ISIDRO', 'Las Orquideas 505 527, San Isidro, PE'),
+    ('NH COLLECTION WTC ROYAL', 'Carrera 8a N 9955, World Trade Center, CO'),
+    ('HOTEL PLAZA SAN FRANCISCO', 'Alameda 816, Santiago, CL'),
+    ('HILTON BUENOS AIRES', 'Macacha Guemes 351, Buenos Aires, AR'),
+]
+
+
+def spanish_date(day):
+    """Format a date the way CWT does, e.g. 'lu., mar. 23'."""
+    return f'{SPANISH_WEEKDAYS[day.weekday()]}., {SPANISH_MONTH_NAMES[day.month - 1]}. {day.day}'
+
+
+def synthetic_itinerary(segments):
+    """
+    Generate the text lines of a CWT itinerary
+
+    Segments alternate between a flight and a hotel stay at its destination,
+    two segments per day, so up to about 700 segments fit in one year.
+
+    Args:
+        segments: Number of flights plus hotels
+
+    Returns:
+        tuple: (lines, flight count, hotel count)
+    """
+    days = (segments + 1) // 2
+    last_day = TRIP_START + timedelta(days=max(days, 1))
+    lines = [
+        'Localizador: BENCH01',
+        f'Viaje a Lima {SPANISH_MONTH_NAMES[TRIP_START.month - 1]}. {TRIP_START.day} - '
+        f'{SPANISH_MONTH_NAMES[last_day.month - 1]}. {last_day.day}, {TRIP_START.year}',
+        'Billete electrónico: 0450000000001',
+        'Viajero: BENCHMARK TRAVELLER',
+    ]
+
+    flights = hotels = 0
+    for index in range(segments):
+        day = TRIP_START + timedelta(days=index // 2)
+        leg = index // 2
+        origin_code, origin_city = ROUTE[leg % len(ROUTE)]
+        destination_code, destination_city = ROUTE[(leg + 1) % len(ROUTE)]
+
+        if index % 2 == 0:
+            airline, carrier = AIRLINES[leg % len(AIRLINES)]
+            lines += [
+                f'SALIDA {spanish_date(day)} | 08:{leg % 60:02d}',
+                origin_city,
+                f'Aeropuerto ({origin_code})',
+                f'LLEGADA {spanish_date(day)} | 11:{leg % 60:02d}',
+                destination_city,
+                f'Aeropuerto ({destination_code})',
+                f'{airline} {carrier} {100 + leg % 9900} CONFIRMADO',
+            ]
+            flights += 1
+        else:
+            name, address = HOTELS[leg % len(HOTELS)]
+            lines += [
+                'ENTRADA',
+                spanish_date(day),
+                'SALIDA',
+                spanish_date(day + timedelta(days=1)),
+                f'{name} CONFIRMADO',
+                f'Confirmación de proveedor: {leg:05d}SF{index:06d}',
+                f'Dirección: {address}',
+                'Teléfono: 51 1 3916500',
+                'Descripción de la tarifa: Habitacion doble',
+                'Notas: none',
+            ]
+            hotels += 1
+
+    return lines, flights, hotels
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def synthetic_pdf(lines, pages):
+    """
+    Lay text lines out over a number of pages as a minimal PDF
+
+    Args:
+        lines: Text lines (cp1252 encodable)
+        pages: Number of pages; lines are spread evenly over them
+
+    Returns:
+        bytes: PDF document
+    """
+    per_page = max(math.ceil(len(lines) / pages), 1)
+    page_lines = [lines[i * per_page:(i + 1) * per_page] for i in range(pages)]
+
+    page_count = len(page_lines)
+    font_id = 3 + 2 * page_count
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [{}] /Count {} >>'.format(
+            ' '.join(f'{3 + 2 * i} 0 R' for i in range(page_count)), page_count).encode(),
+    ]
+    for i, text_lines in enumerate(page_lines):
+        content = ('BT /F1 10 Tf 14 TL 40 800 Td '
+                   + ' '.join(f'({_pdf_escape(line)}) Tj T*' for line in text_lines)
+                   + ' ET').encode('cp1252')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            f'/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>'.encode()
+        )
+        objects.append(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    pdf = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    xref = len(pdf)
+    pdf += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        pdf += f'{offset:010d} 00000 n \n'.encode()
+    pdf += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return bytes(pdf)
+
+
+def parse_size(size):
+    """Parse a 'SEGMENTSxPAGES' size such as '500x200'."""
+    segments, _, pages = size.lower().partition('x')
+    return int(segments), int(pages or 1)
+
+
+def percentile(values, fraction):
+    """Get a percentile of a list of values (nearest rank)."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def peak_rss_mb():
+    """Get this process's peak resident set size in MB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_case(segments, pages, iterations, warmup=1, fixtures_dir=None, backend='pypdf2'):
+    """
+    Benchmark all stages on one synthetic itinerary (runs in a fresh process)
+
+    The first warmup runs are not timed, so one-off costs such as building
+    cached zones and lexers are left out of the percentiles.
+
+    Returns:
+        dict: Case size and backend, parse counts, per-stage timings and peak RSS
+    """
+    from travel_to_ics import ICSGenerator, TravelPDFParser
+
+    lines, expected_flights, expected_hotels = synthetic_itinerary(segments)
+    pdf_bytes = synthetic_pdf(lines, pages)
+
+    timings = {stage: [] for stage in STAGES}
+    parser = TravelPDFParser(pdf_bytes, rules='cwt', backend=backend)
+    for run in range(warmup + iterations):
+        if run == warmup:
+            # Discard the warm-up timings
+            timings = {stage: [] for stage in STAGES}
+
+        started = time.perf_counter()
+        parser.text = parser._extract_text()
+        timings['extract_text'].append(time.perf_counter() - started)
+
+        # Drop the token and year caches so each run parses from scratch
+        parser._tokens = None
+        parser._years = None
+
+        started = time.perf_counter()
+        flights = parser.parse_flights()
+        timings['parse_flights'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        hotels = parser.parse_hotels()
+        timings['parse_hotels'].append(time.perf_counter() - started)
+
+        generator = ICSGenerator()
+        started = time.perf_counter()
+        generator.process_flights(list(flights))
+        timings['process_flights'].append(time.perf_counter() - started)
+
+        for hotel in hotels:
+            generator.add_hotel_event(hotel)
+        started = time.perf_counter()
+        ics = generator.to_ical()
+        timings['to_ical'].append(time.perf_counter() - started)
+
+    if fixtures_dir:
+        stem = os.path.join(fixtures_dir, f'cwt_{segments}x{pages}')
+        with open(f'{stem}.pdf', 'wb') as f:
+            f.write(pdf_bytes)
+        if backend != 'pypdf2':
+            stem += f'.{backend}'
+        with open(f'{stem}.txt', 'w', encoding='utf-8') as f:
+            f.write(parser.text)
+
+    stages = {}
+    for stage, seconds in timings.items():
+        mean = sum(seconds) / len(seconds)
+        stages[stage] = {
+            'p50_ms': round(percentile(seconds, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(seconds, 0.99) * 1000, 3),
+            'mean_ms': round(mean * 1000, 3),
+            'segments_per_second': round(segments / mean, 1) if mean else None,
+        }
+
+    return {
+        'segments': segments,
+        'pages': pages,
+        'backend': backend,
+        'pdf_bytes': len(pdf_bytes),
+        'text_chars': len(parser.text),
+        'ics_bytes': len(ics),
+        'flights': len(flights),
+        'hotels': len(hotels),
+        # A parser regression that drops segments would otherwise look like a speedup
+        'complete': len(flights) == expected_flights and len(hotels) == expected_hotels,
+        'iterations': iterations,
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare(results, baseline):
+    """Print the p50 change per stage against an earlier results file."""
+    previous = {(case['segments'], case['pages'], case.get('backend', 'pypdf2')): case
+                for case in baseline['cases']}
+    print(f"\nChange in p50 vs parser version {baseline.get('parser_version')}:")
+    for case in results['cases']:
+        old = previous.get((case['segments'], case['pages'], case['backend']))
+        if not old:
+            continue
+        changes = []
+        for stage in STAGES:
+            before = old['stages'].get(stage, {}).get('p50_ms')
+            after = case['stages'][stage]['p50_ms']
+            if before:
+                changes.append(f"{stage} {(after - before) / before * 100:+.0f}%")
+        print(f"  {case['segments']}x{case['pages']} {case['backend']}: " + ', '.join(changes))
+
+
+def fastest_backend(results):
+    """
+    Pick the backend with the lowest total extract_text p50 over all sizes
+
+    Backends that dropped segments in any case are left out, since their
+    text doesn't match the parsing rules.
+
+    Returns:
+        str: Backend name, or None if no backend parsed every case
+    """
+    totals = {}
+    incomplete = set()
+    for case in results['cases']:
+        totals[case['backend']] = totals.get(case['backend'], 0.0) + case['stages']['extract_text']['p50_ms']
+        if not case['complete']:
+            incomplete.add(case['backend'])
+    complete = {backend: total for backend, total in totals.items() if backend not in incomplete}
+    return min(complete, key=complete.get) if complete else None
+
+
+def main(argv=None):
+    """Run the benchmark and write the JSON results."""
+    from pdf_backends import available_backends
+    from travel_to_ics import PARSER_VERSION
+
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES,
+                            help='Itinerary sizes as SEGMENTSxPAGES (default: %(default)s)')
+    arg_parser.add_argument('-n', '--iterations', type=int, default=20,
+                            help='Timed runs per size')
+    arg_parser.add_argument('--warmup', type=int, default=1,
+                            help='Untimed runs per size before timing')
+    arg_parser.add_argument('-o', '--output', default='benchmark_results.json',
+                            help='JSON results path')
+    arg_parser.add_argument('--baseline', default=None,
+                            help='Earlier results JSON to compare against')
+    arg_parser.add_argument('--fixtures', default=None,
+                            help='Directory to keep the generated PDFs and extracted texts in')
+    arg_parser.add_argument('--backends', nargs='+', default=['pypdf2'],
+                            help="PDF text extraction backends to time, or 'all' for every "
+                                 "installed one (default: %(default)s)")
+    args = arg_parser.parse_args(argv)
+
+    backends = available_backends() if args.backends == ['all'] else args.backends
+    missing = [backend for backend in backends if backend not in available_backends()]
+    if missing:
+        arg_parser.error(f"PDF backend not installed: {', '.join(missing)}")
+
+    if args.fixtures:
+        os.makedirs(args.fixtures, exist_ok=True)
+
+    results = {
+        'parser_version': PARSER_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'warmup': args.warmup,
+        'cases': [],
+    }
+
+    for backend in backends:
+        for size in args.sizes:
+            segments, pages = parse_size(size)
+            # A fresh process per size, so peak RSS belongs to that size alone
+            with ProcessPoolExecutor(max_workers=1,
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                case = executor.submit(run_case, segments, pages, args.iterations,
+                                       args.warmup, args.fixtures, backend).result()
+            results['cases'].append(case)
+
+            extract = case['stages']['extract_text']
+            parse = case['stages']['parse_flights']
+            print(f"{backend:<9} {segments:>4} segments / {pages:>3} pages: "
+                  f"extract p50 {extract['p50_ms']:.1f} ms, parse_flights p50 {parse['p50_ms']:.1f} ms, "
+                  f"{parse['segments_per_second']} segments/s, peak RSS {case['peak_rss_mb']} MB"
+                  + ('' if case['complete'] else ' (INCOMPLETE PARSE)'))
+
+    if len(backends) > 1:
+        results['fastest_backend'] = fastest_backend(results)
+        print(f"\nFastest backend that parsed every case: {results['fastest_backend']}"
+              " (set PDF_BACKEND to use it)")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
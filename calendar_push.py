@@ -0,0 +1,190 @@
+"""
+Concurrent Google Calendar push
+Sends event batches from a thread pool with rate limiting and retries
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+
+from google_calendar_integration import BATCH_SIZE, backoff_delay, is_retryable_error
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by all worker processes
+
+    The bucket's level lives in a SQLite table, so the gunicorn workers
+    draw from one quota instead of each getting the full rate.
+    """
+
+    def __init__(self, name, rate, capacity, path=None):
+        """
+        Initialize the bucket (starts full)
+
+        Args:
+            name: Bucket name, so several buckets can share one file
+            rate: Tokens added per second
+            capacity: Maximum tokens held, i.e. the allowed burst
+            path: SQLite database file (defaults to RATE_LIMIT_PATH or the
+                  system temp directory)
+        """
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.path = path or os.environ.get('RATE_LIMIT_PATH') or os.path.join(
+            tempfile.gettempdir(), 'travel_to_ics_rate_limits.sqlite3')
+
+    def _connect(self):
+        """Open a connection (one per call, so it is safe across forks)."""
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limits ('
+            ' name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+        return conn
+
+    def _take(self, tokens):
+        """Take the tokens if available, else get the seconds to wait for them."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            # Lock the database for writing before reading the level
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT tokens, updated FROM rate_limits WHERE name = ?', (self.name,)
+            ).fetchone()
+            level = self.capacity if row is None else min(
+                self.capacity, row[0] + max(now - row[1], 0) * self.rate)
+            wait = 0 if level >= tokens else (tokens - level) / self.rate
+            if not wait:
+                level -= tokens
+            conn.execute('INSERT OR REPLACE INTO rate_limits (name, tokens, updated) VALUES (?, ?, ?)',
+                         (self.name, level, now))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        return wait
+
+    def acquire(self, tokens=1):
+        """Block until the tokens are available, then take them."""
+        tokens = min(tokens, self.capacity)
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+# Project-wide quota shared by every push in every worker process
+PROJECT_RATE = 50  # requests per second
+PROJECT_BURST = 500
+project_bucket = TokenBucket('project', PROJECT_RATE, PROJECT_BURST)
+
+# Per-user quota, keyed by GoogleCalendarIntegration.user_key()
+USER_RATE = 10  # requests per second
+USER_BURST = 100
+
+
+def get_user_bucket(user_key):
+    """Get the rate limiter for one user."""
+    return TokenBucket(f'user:{user_key}', USER_RATE, USER_BURST, project_bucket.path)
+
+
+class CalendarPushEngine:
+    """Push events concurrently over a GoogleCalendarIntegration"""
+
+    def __init__(self, gcal, max_workers=4, max_retries=5, batch_size=BATCH_SIZE):
+        """
+        Initialize the push engine
+
+        Args:
+            gcal: Authenticated GoogleCalendarIntegration
+            max_workers: Batches sent at the same time
+            max_retries: Extra attempts for items that failed with a retryable error
+            batch_size: Events per API batch request
+        """
+        self.gcal = gcal
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.batch_size = batch_size
+        self._local = threading.local()
+
+    def _http(self):
+        """Get this thread's own HTTP transport."""
+        if not hasattr(self._local, 'http'):
+            self._local.http = self.gcal.authorized_http() if self.gcal.creds else httplib2.Http()
+        return self._local.http
+
+    def _send_batch(self, operations, indexes, results, errors, user_bucket):
+        """Wait for quota, then send one batch."""
+        user_bucket.acquire(len(indexes))
+        project_bucket.acquire(len(indexes))
+        requests = [(index, self.gcal.event_request(*operations[index])) for index in indexes]
+        self.gcal._execute_batch(requests, results, errors, http=self._http())
+
+    def execute(self, operations):
+        """
+        Run event operations, retrying rate-limited and server errors with backoff
+
+        Args:
+            operations: List of (method, event_id, body) for event_request
+
+        Returns:
+            tuple: (results, errors, retried) where results and errors map
+                   operation index to the response or the final exception
+        """
+        self.gcal._ensure_service()
+        user_bucket = get_user_bucket(self.gcal.user_key())
+
+        results = {}
+        errors = {}
+        retried = 0
+
+        pending = list(range(len(operations)))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    retried += len(pending)
+                    time.sleep(backoff_delay(attempt))
+
+                chunks = [pending[start:start + self.batch_size]
+                          for start in range(0, len(pending), self.batch_size)]
+                futures = [
+                    executor.submit(self._send_batch, operations, chunk, results, errors,
+                                    user_bucket)
+                    for chunk in chunks
+                ]
+                for future in futures:
+                    future.result()
+
+                pending = [index for index in sorted(errors) if is_retryable_error(errors[index])]
+                if not pending:
+                    break
+
+        return results, errors, retried
+
+    def push(self, events_data):
+        """
+        Create events concurrently
+
+        Args:
+            events_data: List of create_event keyword argument dicts
+
+        Returns:
+            dict: {
+                'created': Created events, in input order,
+                'failed': [{'index', 'summary', 'error'}] for items that failed,
+                'retried': Number of item retries sent
+            }
+        """
+        self.gcal._ensure_service()
+        bodies = [self.gcal.build_event_body(**event_data) for event_data in events_data]
+        created, errors, retried = self.execute([('insert', None, body) for body in bodies])
+        return self.gcal._batch_report([body['summary'] for body in bodies],
+                                       created, errors, retried)
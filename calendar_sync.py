@@ -0,0 +1,268 @@
+"""
+Incremental Google Calendar sync
+Pushes an itinerary under deterministic event ids and only sends what changed
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from googleapiclient.errors import HttpError
+
+from calendar_push import CalendarPushEngine
+from custom_ics_generator import CustomICSGenerator
+from result_store import SQLiteResultStore
+
+
+def event_id(*parts):
+    """
+    Get a deterministic Google Calendar event id
+
+    Event ids may only use base32hex characters (0-9, a-v), so this is a
+    hex digest of the parts.
+    """
+    key = '|'.join(['travel-to-ics'] + [str(part) for part in parts])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def trip_key(flights, hotels):
+    """Get the key identifying an itinerary (its reservation codes)."""
+    codes = sorted({flight.reservation_code for flight in flights if flight.reservation_code})
+    if not codes:
+        codes = sorted({hotel.confirmation_number or hotel.name for hotel in hotels})
+    return ','.join(codes)
+
+
+def _numbered(items, key):
+    """Yield (item, item_key) with an occurrence number so repeated keys stay distinct."""
+    seen = {}
+    for item in items:
+        base = key(item)
+        seen[base] = seen.get(base, 0) + 1
+        yield item, (*base, seen[base])
+
+
+def itinerary_events(gcal, flights, hotels, flight_color='11', hotel_color='6',
+                     airport_times=None):
+    """
+    Build the calendar events for an itinerary, each with a stable id
+
+    Flights are identified by reservation code and flight number, hotels by
+    confirmation number, and commutes by the flight they belong to. A change
+    of time or details therefore updates the same event instead of adding one.
+
+    Args:
+        gcal: GoogleCalendarIntegration
+        flights: List of FlightInfo
+        hotels: List of HotelInfo
+        flight_color: Google Calendar color ID for flights and commutes
+        hotel_color: Google Calendar color ID for hotels
+        airport_times: Airport commute times (see CustomICSGenerator)
+
+    Returns:
+        list: (event_id, create_event keyword argument dict) pairs
+    """
+    generator = CustomICSGenerator(
+        flight_color=flight_color,
+        hotel_color=hotel_color,
+        airport_times=airport_times or {}
+    )
+    processed_flights = generator._prepare_flights_with_commutes(flights)
+
+    events = []
+    numbered_flights = _numbered(
+        processed_flights,
+        lambda data: ('flight', data['flight'].reservation_code, data['flight'].flight_number)
+    )
+    for flight_data, flight_key in numbered_flights:
+        flight = flight_data['flight']
+
+        for direction in ('before', 'after'):
+            commute = flight_data.get(f'commute_{direction}')
+            if not commute:
+                continue
+            events.append((event_id(*flight_key, direction), gcal.commute_event_data(
+                title=commute['title'],
+                start_datetime=commute['start'],
+                end_datetime=commute['end'],
+                timezone=commute['timezone'],
+                description=commute.get('description', ''),
+                color_id=flight_color
+            )))
+
+        events.append((event_id(*flight_key), gcal.flight_event_data(flight, color_id=flight_color)))
+
+    numbered_hotels = _numbered(
+        hotels, lambda hotel: ('hotel', hotel.confirmation_number or hotel.name)
+    )
+    for hotel, hotel_key in numbered_hotels:
+        events.append((event_id(*hotel_key), gcal.hotel_event_data(hotel, color_id=hotel_color)))
+
+    return events
+
+
+class SyncState:
+    """Last pushed state per user and trip, shared by all worker processes"""
+
+    def __init__(self, path=None, ttl=365 * 24 * 3600):
+        """
+        Initialize the sync state store
+
+        Args:
+            path: SQLite database file (defaults to the system temp directory)
+            ttl: Seconds before a trip's state is forgotten
+        """
+        self.path = path or os.path.join(tempfile.gettempdir(), 'travel_to_ics_calendar_sync.sqlite3')
+        self.store = SQLiteResultStore(self.path, table='calendar_sync',
+                                       max_entries=100000, ttl=ttl)
+
+    @staticmethod
+    def key(user_key, trip):
+        return f'{user_key}:{trip}'
+
+    def get(self, user_key, trip):
+        """
+        Get the last pushed state of a trip
+
+        Returns:
+            dict: event id -> {'hash', 'summary'} (empty if never pushed)
+        """
+        payload = self.store.get(self.key(user_key, trip))
+        return json.loads(payload) if payload else {}
+
+    def put(self, user_key, trip, state):
+        """Save the pushed state of a trip."""
+        self.store.put(self.key(user_key, trip), json.dumps(state).encode('utf-8'))
+
+
+def _status(error):
+    """Get the HTTP status of an API error, or None."""
+    return error.resp.status if isinstance(error, HttpError) else None
+
+
+def body_hash(body):
+    """Get a hash of an event body, for change detection."""
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class CalendarSync:
+    """Sync itineraries to Google Calendar with inserts, patches and deletes"""
+
+    def __init__(self, gcal, state=None, engine=None):
+        """
+        Initialize the sync
+
+        Args:
+            gcal: Authenticated GoogleCalendarIntegration
+            state: SyncState holding the last pushed state
+            engine: CalendarPushEngine sending the requests
+        """
+        self.gcal = gcal
+        self.state = state or SyncState()
+        self.engine = engine or CalendarPushEngine(gcal)
+
+    def sync(self, trip, events):
+        """
+        Bring a trip's calendar events in line with the given events
+
+        Only new events are inserted, changed events patched and events no
+        longer in the trip deleted. Unchanged events cost no API calls.
+        Event ids are deterministic, so a lost state never duplicates events:
+        an insert that finds its id taken becomes a patch.
+
+        Args:
+            trip: Trip key (see trip_key)
+            events: List of (event_id, create_event keyword argument dict)
+
+        Returns:
+            dict: {
+                'inserted', 'updated', 'deleted', 'unchanged': Event counts,
+                'failed': [{'summary', 'error'}] for events that failed,
+                'retried': Number of item retries sent
+            }
+        """
+        self.gcal._ensure_service()
+        user_key = self.gcal.user_key()
+        previous = self.state.get(user_key, trip)
+
+        bodies = {}
+        for eid, event_data in events:
+            body = self.gcal.build_event_body(**event_data)
+            body['id'] = eid
+            bodies[eid] = body
+
+        operations = []
+        unchanged = 0
+        for eid, body in bodies.items():
+            pushed = previous.get(eid)
+            if pushed is None:
+                operations.append(('insert', eid, body))
+            elif pushed['hash'] != body_hash(body):
+                operations.append(('patch', eid, body))
+            else:
+                unchanged += 1
+        for eid, pushed in previous.items():
+            if eid not in bodies:
+                operations.append(('delete', eid, {'summary': pushed['summary']}))
+
+        results, errors, retried = self._execute(operations)
+
+        # Recover from a stale state: the event exists already (possibly
+        # cancelled by the user), is gone, or was already deleted
+        fallbacks = {}
+        for index, error in list(errors.items()):
+            method, eid, body = operations[index]
+            status = _status(error)
+            if method == 'insert' and status == 409:
+                fallbacks[index] = ('patch', eid, dict(body, status='confirmed'))
+            elif method == 'patch' and status in (404, 410):
+                fallbacks[index] = ('insert', eid, body)
+            elif method == 'delete' and status in (404, 410):
+                results[index] = None
+                del errors[index]
+
+        if fallbacks:
+            indexes = list(fallbacks)
+            fallback_results, fallback_errors, fallback_retried = self._execute(
+                [fallbacks[index] for index in indexes]
+            )
+            retried += fallback_retried
+            for position, index in enumerate(indexes):
+                if position in fallback_results:
+                    results[index] = fallback_results[position]
+                    del errors[index]
+                else:
+                    errors[index] = fallback_errors[position]
+
+        # Failed inserts are left out and failed patches and deletes keep
+        # their old entry, so the next sync tries them again
+        state = dict(previous)
+        for index, (method, eid, body) in enumerate(operations):
+            if index in results and method != 'delete':
+                state[eid] = {'hash': body_hash(bodies[eid]), 'summary': body['summary']}
+            elif index in results:
+                state.pop(eid, None)
+        self.state.put(user_key, trip, state)
+
+        counts = {'insert': 0, 'patch': 0, 'delete': 0}
+        for index in results:
+            counts[operations[index][0]] += 1
+        return {
+            'inserted': counts['insert'],
+            'updated': counts['patch'],
+            'deleted': counts['delete'],
+            'unchanged': unchanged,
+            'failed': [
+                {'summary': operations[index][2]['summary'], 'error': str(error)}
+                for index, error in sorted(errors.items())
+            ],
+            'retried': retried,
+        }
+
+    def _execute(self, operations):
+        """Send operations (deletes carry no body)."""
+        return self.engine.execute([
+            (method, eid, None if method == 'delete' else body)
+            for method, eid, body in operations
+        ])
@@ -0,0 +1,245 @@
+"""
+Asynchronous conversion jobs
+Queues PDF to ICS conversions and tracks their progress in a local file store
+"""
+
+import json
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from fast_ics_generator import FastICSGenerator
+from metrics import StageTimings, registry
+from parse_cache import ParseCache
+from parse_pool import timed_parse
+from travel_to_ics import MAX_PAGES
+
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobStore:
+    """File-backed job store shared by all worker processes"""
+
+    def __init__(self, root=None, ttl=3600):
+        """
+        Initialize the job store
+
+        Args:
+            root: Directory holding one subdirectory per job
+            ttl: Seconds before finished or abandoned jobs are removed
+        """
+        self.root = root or os.path.join(tempfile.gettempdir(), 'travel_to_ics_jobs')
+        self.ttl = ttl
+        os.makedirs(self.root, exist_ok=True)
+
+    def job_dir(self, job_id):
+        """Get the directory for a job, rejecting malformed ids."""
+        if not JOB_ID_PATTERN.match(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.root, job_id)
+
+    def pdf_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), 'input.pdf')
+
+    def ics_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), 'result.ics')
+
+    def create(self, pdf_bytes, filename, settings):
+        """
+        Create a queued job for an uploaded PDF
+
+        Args:
+            pdf_bytes: Uploaded PDF contents
+            filename: Original (secured) file name
+            settings: Dict with flight_color, hotel_color and airport_times
+
+        Returns:
+            str: Job id
+        """
+        self.cleanup()
+
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        with open(self.pdf_path(job_id), 'wb') as f:
+            f.write(pdf_bytes)
+
+        self._write(job_id, {
+            'job_id': job_id,
+            'status': 'queued',
+            'filename': filename,
+            'settings': settings,
+            'created': time.time(),
+            'pages_extracted': 0,
+            'page_count': None,
+            'flights': 0,
+            'hotels': 0,
+            'warnings': [],
+            'error': None,
+        })
+        return job_id
+
+    def get(self, job_id):
+        """
+        Get a job's status
+
+        Returns:
+            dict: Job status, or None if the job does not exist
+        """
+        try:
+            with open(os.path.join(self.job_dir(job_id), 'status.json')) as f:
+                return json.load(f)
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def update(self, job_id, **fields):
+        """Update fields of a job's status."""
+        status = self.get(job_id)
+        if status is None:
+            return
+        status.update(fields)
+        self._write(job_id, status)
+
+    def _write(self, job_id, status):
+        """Write a job status atomically so readers never see partial JSON."""
+        job_dir = self.job_dir(job_id)
+        fd, tmp_path = tempfile.mkstemp(dir=job_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(status, f)
+        os.replace(tmp_path, os.path.join(job_dir, 'status.json'))
+
+    def cleanup(self):
+        """Remove jobs older than the TTL."""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                expired = JOB_ID_PATTERN.match(name) and os.path.getmtime(path) < cutoff
+            except FileNotFoundError:
+                # Removed by another worker in the meantime
+                continue
+            if expired:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def run_conversion_job(store_root, job_id, cache_path=None, max_pages=MAX_PAGES):
+    """
+    Convert a job's PDF to ICS (runs in a pool worker process)
+
+    Args:
+        store_root: JobStore root directory
+        job_id: Job to run
+        cache_path: Optional ParseCache database to read and fill
+        max_pages: Most PDF pages read before the job fails
+
+    Returns:
+        dict: StageTimings snapshot of the conversion
+    """
+    store = JobStore(store_root)
+    status = store.get(job_id)
+    settings = status['settings']
+    timings = StageTimings()
+
+    try:
+        pdf_path = store.pdf_path(job_id)
+        cache = ParseCache(cache_path) if cache_path else None
+        cached = None
+        if cache:
+            with open(pdf_path, 'rb') as f:
+                cache_key = cache.key(f.read())
+            cached = cache.get(cache_key)
+
+        if cached:
+            flights, hotels, warnings = cached
+            timings.count('cache_hits')
+        else:
+            def on_stage(stage):
+                store.update(job_id, status='extracting' if stage == 'extract' else 'parsing')
+
+            def on_page(pages_done, page_count):
+                store.update(job_id, pages_extracted=pages_done, page_count=page_count)
+
+            flights, hotels, warnings = timed_parse(pdf_path, timings, progress=on_page,
+                                                    on_stage=on_stage, max_pages=max_pages)
+            if cache:
+                cache.put(cache_key, flights, hotels, warnings)
+
+        store.update(job_id, status='generating', flights=len(flights), hotels=len(hotels),
+                     warnings=warnings)
+
+        if not flights and not hotels:
+            store.update(job_id, status='failed',
+                         error='No flights or hotels found in the PDF')
+            return timings.snapshot()
+
+        generator = FastICSGenerator(
+            flight_color=settings.get('flight_color', '11'),
+            hotel_color=settings.get('hotel_color', '6'),
+            airport_times=settings.get('airport_times', {})
+        )
+        with timings.stage('ics'):
+            generator.save(store.ics_path(job_id), flights, hotels)
+        timings.count('events', generator.events_written)
+        store.update(job_id, status='done')
+
+    except Exception as e:
+        store.update(job_id, status='failed', error=str(e))
+
+    finally:
+        if os.path.exists(store.pdf_path(job_id)):
+            os.remove(store.pdf_path(job_id))
+
+    return timings.snapshot()
+
+
+class JobQueue:
+    """In-process queue feeding conversion jobs to a ParsePool"""
+
+    def __init__(self, store, parse_pool, cache_path=None, threads=2):
+        """
+        Initialize the job queue (threads start on first submit)
+
+        Args:
+            store: JobStore holding the jobs
+            parse_pool: ParsePool running the conversions
+            cache_path: Optional ParseCache database for the jobs
+            threads: Number of jobs dispatched at once from this process
+        """
+        self.store = store
+        self.parse_pool = parse_pool
+        self.cache_path = cache_path
+        self.threads = threads
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_threads(self):
+        """Start dispatcher threads in this process (again after a fork)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                for _ in range(self.threads):
+                    threading.Thread(target=self._dispatch, daemon=True).start()
+                self._pid = os.getpid()
+
+    def _dispatch(self):
+        """Run queued jobs one at a time."""
+        jobs = self._queue
+        while True:
+            job_id = jobs.get()
+            try:
+                registry.record(self.parse_pool.run(run_conversion_job, self.store.root, job_id,
+                                                    self.cache_path, self.parse_pool.max_pages,
+                                                    wait=None))
+            except Exception as e:
+                self.store.update(job_id, status='failed', error=str(e))
+
+    def submit(self, job_id):
+        """Queue a job created in the store."""
+        self._ensure_threads()
+        self._queue.put(job_id)
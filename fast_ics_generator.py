@@ -0,0 +1,297 @@
+"""
+Fast ICS Generator
+Writes RFC 5545 lines straight from flight and hotel records, without building
+icalendar objects. Output is byte-for-byte the same as CustomICSGenerator's.
+"""
+
+from datetime import timezone
+from functools import lru_cache
+from itertools import chain
+
+from custom_ics_generator import CustomICSGenerator, COLOR_MAP
+from travel_to_ics import UTC_ZONE_IDS, get_zone, vtimezone
+
+
+CRLF = '\r\n'
+
+# Maximum content line length in octets before folding
+FOLD_LIMIT = 75
+
+# Approximate size of the chunks yielded when streaming
+CHUNK_SIZE = 16 * 1024
+
+CALENDAR_HEADER = CRLF.join([
+    'BEGIN:VCALENDAR',
+    'VERSION:2.0',
+    'PRODID:-//Travel to ICS Converter//EN',
+    'CALSCALE:GREGORIAN',
+    'METHOD:PUBLISH',
+]) + CRLF
+CALENDAR_FOOTER = 'END:VCALENDAR' + CRLF
+
+
+def escape_text(text):
+    """Escape a TEXT value (RFC 5545 section 3.3.11), the way icalendar does."""
+    return (
+        text.replace('\\N', '\n')
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+        .replace('\r', '\\n')
+    )
+
+
+def fold_line(line):
+    """
+    Fold a content line at 75 octets (RFC 5545 section 3.1)
+
+    Splits between characters, never inside a UTF-8 sequence, and keeps a
+    trailing backslash on the next line like icalendar does.
+    """
+    if len(line) < FOLD_LIMIT and line.isascii():
+        return line
+
+    folded = []
+    current = []
+    size = 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if current and size + char_size >= FOLD_LIMIT:
+            if len(current) > 1 and current[-1] in '\\^':
+                carried = current.pop()
+                folded.append(''.join(current))
+                current = [carried]
+                size = len(carried.encode('utf-8'))
+            else:
+                folded.append(''.join(current))
+                current = []
+                size = 0
+        current.append(char)
+        size += char_size
+    folded.append(''.join(current))
+    return (CRLF + ' ').join(folded)
+
+
+def text_line(name, value):
+    """Format a TEXT property as a folded content line."""
+    return fold_line(f'{name}:{escape_text(value)}') + CRLF
+
+
+def datetime_line(name, value):
+    """Format a DATE-TIME property with its TZID (or as UTC) as a content line."""
+    stamp = value.strftime('%Y%m%dT%H%M%S')
+    tzid = getattr(value.tzinfo, 'key', None)
+    if value.tzinfo is timezone.utc or tzid in UTC_ZONE_IDS:
+        return fold_line(f'{name}:{stamp}Z') + CRLF
+    if tzid:
+        return fold_line(f'{name};TZID={tzid}:{stamp}') + CRLF
+    return fold_line(f'{name}:{stamp}') + CRLF
+
+
+@lru_cache(maxsize=256)
+def vtimezone_text(tzid, first_year, last_year):
+    """Get the rendered VTIMEZONE for a zone and year range (see vtimezone)."""
+    return vtimezone(tzid, first_year, last_year).to_ical().decode('utf-8')
+
+
+def start_stream(chunks):
+    """
+    Produce the first chunk of a stream now and the rest on demand
+
+    For a streamed response this renders the header, VTIMEZONE blocks and
+    first events before the response starts, so setup errors (e.g. an
+    unknown timezone) are raised while an error page can still be sent.
+
+    Args:
+        chunks: Chunk iterable, such as FastICSGenerator.iter_ical()
+
+    Returns:
+        iterator: All the chunks, starting with the one already produced
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    return chain([first] if first is not None else [], chunks)
+
+
+class FastICSGenerator(CustomICSGenerator):
+    """CustomICSGenerator that renders events as text instead of icalendar objects"""
+
+    def __init__(self, flight_color='11', hotel_color='6', airport_times=None):
+        """
+        Initialize generator with custom settings
+
+        Args:
+            Same as CustomICSGenerator
+        """
+        super().__init__(flight_color, hotel_color, airport_times)
+        self.events = []
+        # Events written by iter_ical so far
+        self.events_written = 0
+
+    def _render_event(self, summary, dtstart, dtend, color, default_color, description,
+                      transp, alarm=''):
+        """Render a VEVENT with properties in icalendar's order (canonical, then alphabetical)."""
+        self.use_zones(dtstart, dtend)
+        return ''.join((
+            'BEGIN:VEVENT', CRLF,
+            text_line('SUMMARY', summary),
+            datetime_line('DTSTART', dtstart),
+            datetime_line('DTEND', dtend),
+            text_line('COLOR', color),
+            text_line('DESCRIPTION', description) if description is not None else '',
+            'STATUS:CONFIRMED', CRLF,
+            'TRANSP:', transp, CRLF,
+            text_line('X-GOOGLE-CALENDAR-CONTENT-COLOR', COLOR_MAP.get(color, COLOR_MAP[default_color])),
+            text_line('X-GOOGLE-CALENDAR-EVENT-COLOR', color),
+            alarm,
+            'END:VEVENT', CRLF,
+        ))
+
+    def add_flight_event(self, flight):
+        """Add flight event with custom color"""
+        description = f'Reservation Code: {flight.reservation_code}\n'
+        if flight.ticket_number:
+            description += f'Ticket Number: {flight.ticket_number}'
+
+        alarm = ''.join((
+            'BEGIN:VALARM', CRLF,
+            'ACTION:DISPLAY', CRLF,
+            text_line('DESCRIPTION', f'Flight {flight.flight_number} in 48 hours'),
+            'TRIGGER:-P2D', CRLF,
+            'END:VALARM', CRLF,
+        ))
+
+        event = self._render_event(
+            f'Flight {flight.flight_number}: {flight.origin} → {flight.destination}',
+            flight.departure_time.replace(tzinfo=get_zone(self.get_timezone(flight.origin))),
+            flight.arrival_time.replace(tzinfo=get_zone(self.get_timezone(flight.destination))),
+            self.flight_color, '11', description, 'OPAQUE', alarm
+        )
+        self.events.append(event)
+        return event
+
+    def add_commute_event(self, title, start_time, end_time, timezone_str, description=''):
+        """Add commute event with custom color"""
+        tz = get_zone(timezone_str)
+        event = self._render_event(
+            title, start_time.replace(tzinfo=tz), end_time.replace(tzinfo=tz),
+            self.flight_color, '11', description or None, 'OPAQUE'
+        )
+        self.events.append(event)
+        return event
+
+    def add_hotel_event(self, hotel):
+        """Add hotel event with custom color"""
+        description = []
+        if hotel.confirmation_number:
+            description.append(f'Confirmation: {hotel.confirmation_number}')
+        if hotel.address:
+            description.append(f'Address: {hotel.address}')
+        if hotel.phone:
+            description.append(f'Phone: {hotel.phone}')
+        if hotel.details:
+            description.append(f'Details: {hotel.details}')
+
+        # Check-in at 3:00 PM and check-out at 12:00 PM local time
+        tz = get_zone(hotel.timezone)
+        event = self._render_event(
+            hotel.name,
+            hotel.checkin_date.replace(hour=15, minute=0, second=0, microsecond=0, tzinfo=tz),
+            hotel.checkout_date.replace(hour=12, minute=0, second=0, microsecond=0, tzinfo=tz),
+            self.hotel_color, '6', '\n'.join(description), 'TRANSPARENT'
+        )
+        self.events.append(event)
+        return event
+
+    def to_ical(self):
+        """Serialize the calendar to ICS bytes."""
+        return ''.join([CALENDAR_HEADER, self._timezones_text(), *self.events,
+                        CALENDAR_FOOTER]).encode('utf-8')
+
+    def _timezones_text(self):
+        """Render one VTIMEZONE per zone used, covering the calendar's years."""
+        return ''.join(vtimezone_text(tzid, *self.years) for tzid in sorted(self.tzids))
+
+    def _use_itinerary_zones(self, flights, hotels):
+        """Record the zones and years that events for these records will write."""
+        for flight_data in self._prepare_flights_with_commutes(flights):
+            flight = flight_data['flight']
+            self.use_zones(
+                flight.departure_time.replace(tzinfo=get_zone(self.get_timezone(flight.origin))),
+                flight.arrival_time.replace(tzinfo=get_zone(self.get_timezone(flight.destination)))
+            )
+            for commute in (flight_data.get('commute_before'), flight_data.get('commute_after')):
+                if commute:
+                    tz = get_zone(commute['timezone'])
+                    self.use_zones(commute['start'].replace(tzinfo=tz),
+                                   commute['end'].replace(tzinfo=tz))
+
+        for hotel in hotels:
+            tz = get_zone(hotel.timezone)
+            self.use_zones(
+                hotel.checkin_date.replace(hour=15, minute=0, second=0, microsecond=0, tzinfo=tz),
+                hotel.checkout_date.replace(hour=12, minute=0, second=0, microsecond=0, tzinfo=tz)
+            )
+
+    def iter_ical(self, flights=(), hotels=(), chunk_size=CHUNK_SIZE):
+        """
+        Serialize the calendar as a stream of ICS byte chunks
+
+        Events already added are written first, then events for the given
+        flights and hotels are rendered as the stream is consumed. Written
+        events are not kept, so memory use does not grow with the size of
+        the calendar.
+
+        Args:
+            flights: List of FlightInfo to add while streaming
+            hotels: List of HotelInfo to add while streaming
+            chunk_size: Approximate size of each yielded chunk in bytes
+
+        Yields:
+            bytes: Consecutive parts of the ICS file
+        """
+        # VTIMEZONEs come first, so find the zones before rendering any event
+        hotels = list(hotels)
+        self._use_itinerary_zones(flights, hotels)
+        header = CALENDAR_HEADER + self._timezones_text()
+
+        buffer = [header]
+        size = len(header)
+
+        def steps():
+            yield
+            yield from self.iter_process_flights(flights)
+            for hotel in hotels:
+                self.add_hotel_event(hotel)
+                yield
+
+        for _ in steps():
+            # Move newly rendered events into the output buffer
+            for event in self.events:
+                buffer.append(event)
+                size += len(event)
+            self.events_written += len(self.events)
+            self.events.clear()
+
+            if size >= chunk_size:
+                yield ''.join(buffer).encode('utf-8')
+                buffer = []
+                size = 0
+
+        buffer.append(CALENDAR_FOOTER)
+        yield ''.join(buffer).encode('utf-8')
+
+    def save(self, output_path, flights=(), hotels=()):
+        """
+        Save calendar to ICS file, streaming it in chunks
+
+        Args:
+            output_path: File to write
+            flights: List of FlightInfo to add while writing
+            hotels: List of HotelInfo to add while writing
+        """
+        with open(output_path, 'wb') as f:
+            for chunk in self.iter_ical(flights, hotels):
+                f.write(chunk)
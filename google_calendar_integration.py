@@ -3,31 +3,136 @@ Google Calendar API Integration
 Allows direct push of events to Google Calendar
 """
 
+import base64
+import hashlib
+import json
 import os
 import pickle
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import google_auth_httplib2
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+
+
+# Maximum number of calls the Calendar API accepts in one batch request
+BATCH_SIZE = 50
+
+# HTTP statuses worth retrying (rate limits and server errors)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# 403 error reasons that are rate limits rather than permission errors
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+
+def error_reasons(error):
+    """Get the reasons (e.g. 'rateLimitExceeded') listed in an API error response."""
+    try:
+        errors = json.loads(error.content.decode('utf-8'))['error'].get('errors', [])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return set()
+    return {item.get('reason') for item in errors if isinstance(item, dict)}
+
+
+def is_retryable_error(error):
+    """Check if a failed API call may succeed when retried."""
+    if isinstance(error, HttpError):
+        if error.resp.status == 403:
+            # Google also uses 403 for forbidden and insufficientPermissions
+            return bool(error_reasons(error) & RATE_LIMIT_REASONS)
+        return error.resp.status in RETRYABLE_STATUSES
+    # Connection problems and other transport errors
+    return True
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Get a jittered exponential backoff delay in seconds for a retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# Per-process caches shared by all instances. Services are kept per thread,
+# since their HTTP transport must not be used by two threads at once; each
+# transport keeps its connections open for the next request on that thread.
+SERVICE_CACHE_SIZE = 64
+_credentials_cache = {}  # token file -> (mtime, credentials)
+_service_cache = OrderedDict()  # (user key, api endpoint, thread id) -> service
+_discovery_document = None
+_cache_lock = threading.Lock()
+
+
+def _calendar_discovery_document():
+    """Get the parsed Calendar API discovery document (None if not bundled)."""
+    global _discovery_document
+    if _discovery_document is None:
+        document = get_static_doc('calendar', 'v3')
+        if document:
+            _discovery_document = json.loads(document)
+    return _discovery_document
+
+
+def _write_token(token_file, creds):
+    """Write credentials atomically, so other processes never read a partial file."""
+    directory = os.path.dirname(os.path.abspath(token_file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as token:
+            pickle.dump(creds, token)
+        os.replace(tmp_path, token_file)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    with _cache_lock:
+        _credentials_cache[token_file] = (os.path.getmtime(token_file), creds)
+
+
+def _read_token(token_file):
+    """Read credentials, reusing the unpickled object while the file is unchanged."""
+    try:
+        mtime = os.path.getmtime(token_file)
+    except FileNotFoundError:
+        return None
+    with _cache_lock:
+        cached = _credentials_cache.get(token_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(token_file, 'rb') as token:
+        creds = pickle.load(token)
+    with _cache_lock:
+        _credentials_cache[token_file] = (mtime, creds)
+    return creds
 
 
 class GoogleCalendarIntegration:
     """Handle Google Calendar API operations"""
 
-    SCOPES = ['https://www.googleapis.com/auth/calendar.events']
+    # openid adds an ID token, whose subject identifies the Google account
+    SCOPES = ['openid', 'https://www.googleapis.com/auth/calendar.events']
 
-    def __init__(self, credentials_file='credentials.json', token_file='token.pickle'):
+    def __init__(self, credentials_file='credentials.json', token_file='token.pickle',
+                 api_endpoint=None):
         """
         Initialize Google Calendar integration
 
         Args:
             credentials_file: Path to OAuth2 credentials JSON file
             token_file: Path to save/load user tokens
+            api_endpoint: Override the Calendar API root URL (e.g. a local
+                          stub server for testing)
         """
         self.credentials_file = credentials_file
         self.token_file = token_file
+        self.api_endpoint = api_endpoint or os.environ.get('GOOGLE_CALENDAR_API_ENDPOINT')
         self.creds = None
         self.service = None
 
@@ -85,8 +190,7 @@ class GoogleCalendarIntegration:
         self.creds = flow.credentials
 
         # Save credentials for future use
-        with open(self.token_file, 'wb') as token:
-            pickle.dump(self.creds, token)
+        _write_token(self.token_file, self.creds)
 
         return True
 
@@ -97,46 +201,64 @@ class GoogleCalendarIntegration:
         Returns:
             bool: True if credentials are valid
         """
-        if os.path.exists(self.token_file):
-            with open(self.token_file, 'rb') as token:
-                self.creds = pickle.load(token)
+        self.creds = _read_token(self.token_file) or self.creds
 
         # Refresh credentials if expired
         if self.creds and self.creds.expired and self.creds.refresh_token:
             self.creds.refresh(Request())
-            with open(self.token_file, 'wb') as token:
-                pickle.dump(self.creds, token)
+            _write_token(self.token_file, self.creds)
 
         if self.creds and self.creds.valid:
-            self.service = build('calendar', 'v3', credentials=self.creds)
+            self.service = self._cached_service()
             return True
 
         return False
 
-    def create_event(self, summary, start_datetime, end_datetime,
-                    description='', location='', timezone='UTC',
-                    color_id=None, reminders=None, transparency='opaque'):
+    def _cached_service(self):
+        """Get this thread's API service for the current credentials, building it once."""
+        key = (self.user_key(), self.api_endpoint, threading.get_ident())
+        with _cache_lock:
+            service = _service_cache.get(key)
+            if service is not None and service._http.credentials is self.creds:
+                _service_cache.move_to_end(key)
+                return service
+
+        client_options = {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+        http = self.authorized_http()
+        document = _calendar_discovery_document()
+        if document:
+            service = build_from_document(document, http=http, client_options=client_options)
+        else:
+            service = build('calendar', 'v3', http=http, client_options=client_options)
+
+        with _cache_lock:
+            _service_cache[key] = service
+            _service_cache.move_to_end(key)
+            while len(_service_cache) > SERVICE_CACHE_SIZE:
+                _service_cache.popitem(last=False)
+        return service
+
+    def authorized_http(self):
+        """Get a new authorized HTTP transport for the current credentials."""
+        return google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http())
+
+    def _ensure_service(self):
+        """Load credentials and build the API service if needed."""
+        if not self.service:
+            if not self.load_credentials():
+                raise Exception("Not authenticated with Google Calendar")
+
+    def build_event_body(self, summary, start_datetime, end_datetime,
+                         description='', location='', timezone='UTC',
+                         color_id=None, reminders=None, transparency='opaque'):
         """
-        Create a single calendar event
+        Build the API request body for a calendar event
 
-        Args:
-            summary: Event title
-            start_datetime: Start datetime object
-            end_datetime: End datetime object
-            description: Event description
-            location: Event location
-            timezone: Timezone string (e.g., 'America/Santiago')
-            color_id: Google Calendar color ID (1-11)
-            reminders: List of reminders in minutes (e.g., [10, 2880])
-            transparency: 'opaque' (busy) or 'transparent' (free)
+        Takes the same arguments as create_event.
 
         Returns:
-            dict: Created event data
+            dict: Event resource for events().insert()
         """
-        if not self.service:
-            if not self.load_credentials():
-                raise Exception("Not authenticated with Google Calendar")
-
         # Format datetime for Google Calendar API
         start_tz = start_datetime.strftime('%Y-%m-%dT%H:%M:%S')
         end_tz = end_datetime.strftime('%Y-%m-%dT%H:%M:%S')
@@ -169,6 +291,36 @@ class GoogleCalendarIntegration:
                 ]
             }
 
+        return event
+
+    def create_event(self, summary, start_datetime, end_datetime,
+                    description='', location='', timezone='UTC',
+                    color_id=None, reminders=None, transparency='opaque'):
+        """
+        Create a single calendar event
+
+        Args:
+            summary: Event title
+            start_datetime: Start datetime object
+            end_datetime: End datetime object
+            description: Event description
+            location: Event location
+            timezone: Timezone string (e.g., 'America/Santiago')
+            color_id: Google Calendar color ID (1-11)
+            reminders: List of reminders in minutes (e.g., [10, 2880])
+            transparency: 'opaque' (busy) or 'transparent' (free)
+
+        Returns:
+            dict: Created event data
+        """
+        self._ensure_service()
+
+        event = self.build_event_body(
+            summary, start_datetime, end_datetime,
+            description=description, location=location, timezone=timezone,
+            color_id=color_id, reminders=reminders, transparency=transparency
+        )
+
         try:
             event = self.service.events().insert(
                 calendarId='primary',
@@ -192,6 +344,19 @@ class GoogleCalendarIntegration:
         Returns:
             dict: Created event data
         """
+        return self.create_event(**self.flight_event_data(flight, color_id))
+
+    def flight_event_data(self, flight, color_id='11'):
+        """
+        Get create_event arguments for a flight
+
+        Args:
+            flight: FlightInfo object
+            color_id: Google Calendar color ID
+
+        Returns:
+            dict: Keyword arguments for create_event
+        """
         summary = f"Flight {flight.flight_number}: {flight.origin} → {flight.destination}"
         description = f"Reservation Code: {flight.reservation_code}\n"
         if flight.ticket_number:
@@ -201,7 +366,7 @@ class GoogleCalendarIntegration:
         from travel_to_ics import AIRPORT_TIMEZONES
         origin_tz = AIRPORT_TIMEZONES.get(flight.origin, 'UTC')
 
-        return self.create_event(
+        return dict(
             summary=summary,
             start_datetime=flight.departure_time,
             end_datetime=flight.arrival_time,
@@ -223,6 +388,19 @@ class GoogleCalendarIntegration:
         Returns:
             dict: Created event data
         """
+        return self.create_event(**self.hotel_event_data(hotel, color_id))
+
+    def hotel_event_data(self, hotel, color_id='6'):
+        """
+        Get create_event arguments for a hotel stay
+
+        Args:
+            hotel: HotelInfo object
+            color_id: Google Calendar color ID
+
+        Returns:
+            dict: Keyword arguments for create_event
+        """
         summary = hotel.name
 
         description_parts = []
@@ -237,7 +415,7 @@ class GoogleCalendarIntegration:
 
         description = '\n'.join(description_parts)
 
-        return self.create_event(
+        return dict(
             summary=summary,
             start_datetime=hotel.checkin_date,
             end_datetime=hotel.checkout_date,
@@ -264,7 +442,22 @@ class GoogleCalendarIntegration:
         Returns:
             dict: Created event data
         """
-        return self.create_event(
+        return self.create_event(**self.commute_event_data(
+            title, start_datetime, end_datetime, timezone, description, color_id
+        ))
+
+    def commute_event_data(self, title, start_datetime, end_datetime,
+                           timezone, description='', color_id='11'):
+        """
+        Get create_event arguments for a commute
+
+        Args:
+            Same as create_commute_event
+
+        Returns:
+            dict: Keyword arguments for create_event
+        """
+        return dict(
             summary=title,
             start_datetime=start_datetime,
             end_datetime=end_datetime,
@@ -274,23 +467,158 @@ class GoogleCalendarIntegration:
             transparency='opaque'
         )
 
-    def batch_create_events(self, events_data):
+    def batch_create_events(self, events_data, max_retries=2):
+        """
+        Create multiple events using API batch requests
+
+        Events are sent in batches of up to BATCH_SIZE calls. Items that fail
+        with a retryable error are sent again (only those items) after a
+        backoff delay, up to max_retries more times.
+
+        Args:
+            events_data: List of create_event keyword argument dicts
+            max_retries: Extra attempts for items that failed
+
+        Returns:
+            dict: {
+                'created': Created events, in input order,
+                'failed': [{'index', 'summary', 'error'}] for items that failed,
+                'retried': Number of item retries sent
+            }
+        """
+        self._ensure_service()
+
+        bodies = [self.build_event_body(**event_data) for event_data in events_data]
+        created = {}
+        errors = {}
+        retried = 0
+
+        pending = list(range(len(bodies)))
+        for attempt in range(max_retries + 1):
+            if attempt:
+                retried += len(pending)
+                time.sleep(backoff_delay(attempt))
+
+            for chunk_start in range(0, len(pending), BATCH_SIZE):
+                self._execute_insert_batch(
+                    bodies, pending[chunk_start:chunk_start + BATCH_SIZE], created, errors
+                )
+
+            pending = [index for index in sorted(errors) if is_retryable_error(errors[index])]
+            if not pending:
+                break
+
+        return self._batch_report([body['summary'] for body in bodies], created, errors, retried)
+
+    @staticmethod
+    def _batch_report(summaries, created, errors, retried):
+        """Build the result report for a batch push."""
+        return {
+            'created': [created[index] for index in sorted(created)],
+            'failed': [
+                {'index': index, 'summary': summaries[index], 'error': str(error)}
+                for index, error in sorted(errors.items())
+            ],
+            'retried': retried,
+        }
+
+    def account_id(self):
         """
-        Create multiple events at once
+        Get the Google account id (the ID token's subject) of the credentials
+
+        The ID token comes straight from Google's token endpoint over TLS,
+        so its claims are read without checking the signature.
+
+        Returns:
+            str: Account id, or None if the credentials have no ID token
+        """
+        id_token = self.creds and getattr(self.creds, 'id_token', None)
+        if not id_token:
+            return None
+        try:
+            payload = id_token.split('.')[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        except (IndexError, ValueError):
+            return None
+        return claims.get('sub')
+
+    def user_key(self):
+        """
+        Get a stable, non-secret id for the authorized user
+
+        Keys sync state and rate limits, so it must stay the same across
+        logins. Access tokens change on every login, and Google only sends
+        a refresh token on first consent, so the account id is used. Tokens
+        only back up credentials saved before the openid scope was added.
+        """
+        account = self.account_id()
+        if account:
+            return hashlib.sha256(f'account:{account}'.encode('utf-8')).hexdigest()[:16]
+        token = self.creds and (self.creds.refresh_token or self.creds.token)
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()[:16] if token else 'anonymous'
+
+    def event_request(self, method, event_id=None, body=None):
+        """
+        Build an events API request for the primary calendar
 
         Args:
-            events_data: List of event dictionaries
+            method: 'insert', 'patch' or 'delete'
+            event_id: Event id (patch and delete)
+            body: Event resource (insert and patch)
 
         Returns:
-            list: Created events
+            HttpRequest: Request to execute or add to a batch
+        """
+        events = self.service.events()
+        if method == 'insert':
+            return events.insert(calendarId='primary', body=body)
+        if method == 'patch':
+            return events.patch(calendarId='primary', eventId=event_id, body=body)
+        if method == 'delete':
+            return events.delete(calendarId='primary', eventId=event_id)
+        raise ValueError(f'Unknown event request method: {method}')
+
+    def _execute_insert_batch(self, bodies, indexes, created, errors, http=None):
+        """Send one batch of event inserts, recording results by item index."""
+        self._execute_batch(
+            [(index, self.event_request('insert', body=bodies[index])) for index in indexes],
+            created, errors, http=http
+        )
+
+    def _execute_batch(self, requests, results, errors, http=None):
         """
-        created_events = []
+        Send one batch of API requests, recording results by item index
 
-        for event_data in events_data:
-            try:
-                created_event = self.create_event(**event_data)
-                created_events.append(created_event)
-            except Exception as e:
-                print(f"Error creating event {event_data.get('summary')}: {e}")
+        Args:
+            requests: List of (index, HttpRequest)
+            results: Dict filled with index -> response for successful items
+            errors: Dict filled with index -> exception for failed items
+            http: Transport to use instead of the service's own one (the
+                  shared transport is not safe to use from several threads)
+        """
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                errors[index] = exception
+            else:
+                results[index] = response
+                errors.pop(index, None)
+
+        if self.api_endpoint:
+            # The discovery batch URL ignores api_endpoint, so point it there too
+            batch = BatchHttpRequest(
+                callback=callback,
+                batch_uri=f"{self.api_endpoint.rstrip('/')}/batch/calendar/v3"
+            )
+        else:
+            batch = self.service.new_batch_http_request(callback=callback)
+        for index, api_request in requests:
+            batch.add(api_request, request_id=str(index))
 
-        return created_events
+        try:
+            batch.execute(http=http)
+        except Exception as e:
+            # The whole batch request failed, so every item in it failed
+            for index, _ in requests:
+                if index not in results:
+                    errors[index] = e
@@ -0,0 +1,247 @@
+"""
+Conversion pipeline metrics
+Per-stage timers and counters, aggregated per worker process and rendered in
+the Prometheus text exposition format
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Histogram bucket upper bounds in seconds, shared by stage and request timings
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Counters with their Prometheus help text
+COUNTERS = {
+    'pages': 'PDF pages extracted',
+    'flights': 'Flight segments parsed',
+    'hotels': 'Hotel segments parsed',
+    'regex_scans': 'Regular expression passes over the whole document text made by the parser',
+    'events': 'Calendar events emitted',
+    'pdfs_parsed': 'PDFs parsed',
+    'cache_hits': 'Uploads answered from the parse cache',
+}
+
+NAMESPACE = 'travel_to_ics'
+
+
+class StageTimings:
+    """Stage durations and counters collected for one request or conversion"""
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as a stage (repeated stages add up)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def timed_iter(self, name, iterable):
+        """
+        Yield from an iterable, timing only the work of producing each item
+
+        Time spent by the consumer between items (e.g. a slow client reading
+        a streamed response) is not counted.
+        """
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - started)
+                return
+            self.add_time(name, time.perf_counter() - started)
+            yield item
+
+    def snapshot(self):
+        """Get the timings as plain data (e.g. to return them from a pool worker)."""
+        return {'stages': dict(self.stages), 'counters': dict(self.counters)}
+
+    def merge(self, snapshot):
+        """Add timings taken elsewhere, e.g. in a parse pool worker."""
+        for name, seconds in snapshot.get('stages', {}).items():
+            self.add_time(name, seconds)
+        for name, amount in snapshot.get('counters', {}).items():
+            self.count(name, amount)
+
+    def server_timing(self):
+        """Format the stage durations as a Server-Timing header value."""
+        return ', '.join(
+            f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()
+        )
+
+
+class _Histogram:
+    """Cumulative bucket counts, sum, count and max of observed durations"""
+
+    __slots__ = ('buckets', 'sum', 'count', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+        self.sum += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+class MetricsRegistry:
+    """
+    Metrics of one worker process
+
+    Each gunicorn worker keeps its own registry, so /metrics and /health
+    report the worker that answered (see the pid in worker_info).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.stages = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.requests = {}
+        self.request_counts = {}
+
+    def _check_fork(self):
+        """Start from zero in a forked worker instead of reporting the parent's numbers."""
+        if self.pid != os.getpid():
+            self.__init__()
+
+    def record(self, timings):
+        """
+        Add a request's or conversion's StageTimings to the aggregates
+
+        Args:
+            timings: StageTimings (or its snapshot)
+        """
+        if isinstance(timings, StageTimings):
+            timings = timings.snapshot()
+        with self._lock:
+            self._check_fork()
+            for name, seconds in timings['stages'].items():
+                self.stages.setdefault(name, _Histogram()).observe(seconds)
+            for name, amount in timings['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_request(self, endpoint, status, seconds):
+        """Count a finished HTTP request and its duration."""
+        with self._lock:
+            self._check_fork()
+            self.requests.setdefault(endpoint, _Histogram()).observe(seconds)
+            key = (endpoint, status)
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    def timed_stream(self, name, chunks, counters=None):
+        """
+        Stream chunks, recording the time spent producing them as a stage
+
+        The stage is recorded when the stream ends, which for a streamed
+        response is after the request itself has finished.
+
+        Args:
+            name: Stage name
+            chunks: Iterable producing the stream
+            counters: Optional callable returning counters to add at the end
+        """
+        timings = StageTimings()
+        yield from timings.timed_iter(name, chunks)
+        for counter, amount in (counters() if counters else {}).items():
+            timings.count(counter, amount)
+        self.record(timings)
+
+    def snapshot(self):
+        """
+        Get this worker's aggregates
+
+        Returns:
+            dict: pid, uptime, request count, per-stage count/mean/max and counters
+        """
+        with self._lock:
+            self._check_fork()
+            return {
+                'pid': self.pid,
+                'uptime_seconds': round(time.time() - self.started, 1),
+                'requests': sum(self.request_counts.values()),
+                'stages': {name: histogram.summary() for name, histogram in self.stages.items()},
+                'counters': dict(self.counters),
+            }
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            self._check_fork()
+            lines = [
+                f'# HELP {NAMESPACE}_worker_info Worker process answering this scrape',
+                f'# TYPE {NAMESPACE}_worker_info gauge',
+                f'{NAMESPACE}_worker_info{_labels(pid=self.pid)} 1',
+                f'# HELP {NAMESPACE}_worker_start_time_seconds Worker start time since the epoch',
+                f'# TYPE {NAMESPACE}_worker_start_time_seconds gauge',
+                f'{NAMESPACE}_worker_start_time_seconds {self.started:.3f}',
+            ]
+            lines += self._render_histograms(
+                'stage_seconds', 'Time spent in each conversion stage', 'stage', self.stages)
+            lines += self._render_histograms(
+                'http_request_seconds', 'HTTP request duration by endpoint', 'endpoint', self.requests)
+
+            lines += [
+                f'# HELP {NAMESPACE}_http_requests_total HTTP requests by endpoint and status',
+                f'# TYPE {NAMESPACE}_http_requests_total counter',
+            ]
+            for (endpoint, status), count in sorted(self.request_counts.items()):
+                lines.append(f'{NAMESPACE}_http_requests_total{_labels(endpoint=endpoint, status=status)} {count}')
+
+            for name, value in sorted(self.counters.items()):
+                metric = f'{NAMESPACE}_{name}_total'
+                lines += [
+                    f'# HELP {metric} {COUNTERS.get(name, name.replace("_", " ").capitalize())}',
+                    f'# TYPE {metric} counter',
+                    f'{metric} {value}',
+                ]
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(name, help_text, label, histograms):
+        metric = f'{NAMESPACE}_{name}'
+        lines = [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for key, histogram in sorted(histograms.items()):
+            for bound, count in zip(BUCKETS, histogram.buckets):
+                lines.append(f'{metric}_bucket{_labels(**{label: key, "le": bound})} {count}')
+            lines.append(f'{metric}_bucket{_labels(**{label: key, "le": "+Inf"})} {histogram.count}')
+            lines.append(f'{metric}_sum{_labels(**{label: key})} {histogram.sum:.6f}')
+            lines.append(f'{metric}_count{_labels(**{label: key})} {histogram.count}')
+        return lines
+
+
+# Registry of this worker process
+registry = MetricsRegistry()
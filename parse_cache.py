@@ -0,0 +1,52 @@
+"""
+Parse result cache for uploaded travel PDFs
+Stores parsed flights and hotels keyed by a hash of the PDF bytes
+"""
+
+import hashlib
+import os
+import tempfile
+
+from pdf_backends import resolve_backend
+from travel_to_ics import PARSER_VERSION
+from result_store import SQLiteResultStore, encode_itinerary, decode_itinerary
+
+
+class ParseCache:
+    """On-disk LRU cache of parse results, shared by all worker processes"""
+
+    def __init__(self, path=None, max_entries=256, ttl=24 * 3600):
+        """
+        Initialize the parse cache
+
+        Args:
+            path: SQLite database file (defaults to the system temp directory)
+            max_entries: Maximum number of cached PDFs kept
+            ttl: Seconds before a cached result expires
+        """
+        self.path = path or os.path.join(tempfile.gettempdir(), 'travel_to_ics_parse_cache.sqlite3')
+        self.store = SQLiteResultStore(self.path, table='parse_cache',
+                                       max_entries=max_entries, ttl=ttl)
+
+    @staticmethod
+    def key(pdf_bytes):
+        """Get the cache key for PDF bytes, the current parser version and extraction backend."""
+        digest = hashlib.sha256(pdf_bytes).hexdigest()
+        return f'{PARSER_VERSION}:{resolve_backend().name}:{digest}'
+
+    def get(self, key):
+        """
+        Look up cached parse results
+
+        Returns:
+            tuple: (flights, hotels, warnings), or None if missing or expired
+        """
+        payload = self.store.get(key)
+        if payload is None:
+            return None
+        itinerary = decode_itinerary(payload)
+        return itinerary['flights'], itinerary['hotels'], itinerary.get('warnings', [])
+
+    def put(self, key, flights, hotels, warnings=()):
+        """Store parse results and evict expired or least recently used entries."""
+        self.store.put(key, encode_itinerary(flights, hotels, warnings=list(warnings)))
@@ -0,0 +1,208 @@
+"""
+Process pool for PDF parsing
+Runs CPU-bound PDF extraction and parsing outside the request threads
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+
+from metrics import StageTimings
+from travel_to_ics import MAX_PAGES, TravelPDFParser
+
+
+class ParsePoolBusy(Exception):
+    """Raised when too many parse jobs are already waiting"""
+
+
+class ParseTimeout(Exception):
+    """Raised when a parse job takes longer than the configured timeout"""
+
+
+def timed_parse(pdf_path, timings, progress=None, on_stage=None, max_pages=MAX_PAGES):
+    """
+    Parse a travel PDF, recording extract and parse stages and counters
+
+    Args:
+        pdf_path: Path to the PDF file, or the PDF bytes
+        timings: StageTimings to record into
+        progress: Optional page progress callback (see TravelPDFParser)
+        on_stage: Optional callback(stage) called as 'extract' and 'parse' start
+        max_pages: Most pages read before giving up (see TravelPDFParser)
+
+    Returns:
+        tuple: (flights, hotels, warnings as Diagnostic.to_dict() dicts)
+    """
+    if on_stage:
+        on_stage('extract')
+    with timings.stage('extract'):
+        parser = TravelPDFParser(pdf_path, progress=progress, max_pages=max_pages)
+    if on_stage:
+        on_stage('parse')
+    with timings.stage('parse'):
+        flights = parser.parse_flights()
+        hotels = parser.parse_hotels()
+
+    for name, amount in parser.counters.items():
+        timings.count(name, amount)
+    timings.count('flights', len(flights))
+    timings.count('hotels', len(hotels))
+    timings.count('pdfs_parsed')
+    return flights, hotels, [diagnostic.to_dict() for diagnostic in parser.diagnostics]
+
+
+def parse_pdf(pdf_path, max_pages=MAX_PAGES):
+    """
+    Parse a travel PDF (runs in a pool worker process)
+
+    Args:
+        pdf_path: Path to the PDF file, or the PDF bytes
+        max_pages: Most pages read before giving up
+
+    Returns:
+        tuple: (flights, hotels, warnings, StageTimings snapshot)
+    """
+    timings = StageTimings()
+    flights, hotels, warnings = timed_parse(pdf_path, timings, max_pages=max_pages)
+    return flights, hotels, warnings, timings.snapshot()
+
+
+class ParsePool:
+    """Bounded pool of parser processes with timeouts and worker recycling"""
+
+    def __init__(self, processes=2, max_pending=8, timeout=30, max_jobs_per_worker=50,
+                 max_pages=MAX_PAGES):
+        """
+        Initialize the parse pool (processes start on first use)
+
+        Args:
+            processes: Number of parser processes
+            max_pending: Maximum jobs queued or running at once
+            timeout: Seconds a single job may run (waiting for a free
+                     process doesn't count)
+            max_jobs_per_worker: Jobs before a worker process is replaced,
+                                 which caps PyPDF2 memory growth
+            max_pages: Most PDF pages read per job, which caps the work
+                       a single upload can cause
+        """
+        self.processes = processes
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_pages = max_pages
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Jobs handed to a process; the rest wait here, not in the pool's
+        # queue, so the timeout only runs while a job has a process
+        self._running = threading.BoundedSemaphore(processes)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        # Jobs being waited for per pool, and pools retired after a timeout
+        self._jobs = {}
+        self._retired = set()
+
+    def _checkout_pool(self):
+        """Get the pool for this process (creating it after a fork) and count a job on it."""
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                if self._pid != os.getpid():
+                    # Pools inherited from the parent process are not ours to use
+                    self._jobs = {}
+                    self._retired = set()
+                context = multiprocessing.get_context('spawn')
+                self._pool = context.Pool(
+                    processes=self.processes,
+                    maxtasksperchild=self.max_jobs_per_worker
+                )
+                self._pid = os.getpid()
+            self._jobs[self._pool] = self._jobs.get(self._pool, 0) + 1
+            return self._pool
+
+    def _checkin_pool(self, pool):
+        """Stop counting a job, terminating a retired pool once no other job is waiting on it."""
+        with self._lock:
+            self._jobs[pool] -= 1
+            finished = pool in self._retired and not self._jobs[pool]
+            if finished:
+                del self._jobs[pool]
+                self._retired.discard(pool)
+        if finished:
+            pool.terminate()
+
+    def _retire_pool(self, pool):
+        """
+        Send new jobs to a fresh pool after a job in this one got stuck
+
+        The stuck job's worker can't be stopped on its own, so the pool is
+        terminated once the other jobs running in it have finished.
+        """
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+            self._retired.add(pool)
+
+    def run(self, func, *args, wait=1.0):
+        """
+        Run a function in the pool and wait for its result
+
+        Args:
+            func: Module-level function to call in a worker process
+            *args: Arguments for the function
+            wait: Seconds to wait for a free slot before giving up
+                  (None waits until one is free)
+
+        Returns:
+            The function's return value
+        """
+        if not self._slots.acquire(timeout=wait):
+            raise ParsePoolBusy('Too many PDFs are being processed right now')
+
+        try:
+            with self._running:
+                pool = self._checkout_pool()
+                try:
+                    result = pool.apply_async(func, args)
+                    return result.get(self.timeout)
+                except multiprocessing.TimeoutError:
+                    self._retire_pool(pool)
+                    raise ParseTimeout(f'PDF parsing took longer than {self.timeout} seconds')
+                finally:
+                    self._checkin_pool(pool)
+        finally:
+            self._slots.release()
+
+    def parse(self, pdf_path, wait=1.0, timings=None, warnings=None):
+        """
+        Parse a PDF in the pool and wait for the result
+
+        Args:
+            pdf_path: Path to the PDF file, or the PDF bytes
+            wait: Seconds to wait for a free slot before giving up
+            timings: Optional StageTimings to add the worker's stages to,
+                     plus a 'pool' stage for queueing and transfer time
+            warnings: Optional list to add the parser's warnings to
+                      (see Diagnostic.to_dict)
+
+        Returns:
+            tuple: (flights, hotels)
+        """
+        started = time.perf_counter()
+        flights, hotels, parse_warnings, worker_timings = self.run(parse_pdf, pdf_path, self.max_pages, wait=wait)
+        if warnings is not None:
+            warnings.extend(parse_warnings)
+        if timings is not None:
+            elapsed = time.perf_counter() - started
+            timings.add_time('pool', max(elapsed - sum(worker_timings['stages'].values()), 0.0))
+            timings.merge(worker_timings)
+        return flights, hotels
+
+    def close(self):
+        """Stop the worker processes."""
+        with self._lock:
+            pools = self._retired | ({self._pool} if self._pool is not None else set())
+            self._pool = None
+            self._jobs = {}
+            self._retired = set()
+        for pool in pools:
+            pool.terminate()
+            pool.join()
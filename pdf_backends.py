@@ -0,0 +1,206 @@
+"""
+PDF text extraction backends
+PyPDF2 is always available; pypdfium2 and pdfminer.six are used when
+installed. Every backend's page text goes through normalize_text, so the
+parsing rules match whichever engine extracted it.
+"""
+
+import importlib.util
+import io
+import os
+import re
+import unicodedata
+
+import PyPDF2
+
+
+# Backend used when none is configured
+DEFAULT_BACKEND = 'pypdf2'
+
+# Order 'auto' tries backends in, fastest first (see benchmark.py --backends)
+BACKEND_PREFERENCE = ('pypdfium2', 'pypdf2')
+
+# Format characters some engines leave in the text (soft hyphen, zero-width
+# spaces and joiners, word joiner, byte order mark)
+_INVISIBLE_CHARS = re.compile('[\u00ad\u200b-\u200d\u2060\ufeff]')
+_TRAILING_SPACE = re.compile(r'[ \t]+$', re.MULTILINE)
+
+# Compatibility characters folded into plain text: Unicode spaces (no-break,
+# en/em and other fixed-width, narrow no-break, ideographic) and Latin
+# ligatures. Other compatibility forms such as "º" are kept as printed.
+_COMPATIBILITY_FOLDS = str.maketrans({
+    **{space: ' ' for space in '\u00a0\u2000\u2001\u2002\u2003\u2004\u2005\u2006'
+                               '\u2007\u2008\u2009\u200a\u202f\u205f\u3000'},
+    '\ufb00': 'ff', '\ufb01': 'fi', '\ufb02': 'fl', '\ufb03': 'ffi',
+    '\ufb04': 'ffl', '\ufb05': 'st', '\ufb06': 'st',
+})
+
+
+def normalize_text(text):
+    """
+    Normalise extracted page text so the parsing rules see the same text
+    whichever backend produced it
+
+    Line breaks become \\n, decomposed accents are composed (NFC), Unicode
+    spaces and ligatures such as "ﬁ" are folded to plain characters,
+    invisible characters and trailing spaces are removed, and the page ends
+    with a line break so it doesn't run into the next one. Unlike NFKC,
+    characters such as "º" in "Nº" are left as they are.
+
+    Args:
+        text: Raw text of one page
+
+    Returns:
+        str: Normalised text
+    """
+    text = text.replace('\r\n', '\n').replace('\r', '\n').replace('\x0c', '\n')
+    if not unicodedata.is_normalized('NFC', text):
+        text = unicodedata.normalize('NFC', text)
+    text = text.translate(_COMPATIBILITY_FOLDS)
+    text = _INVISIBLE_CHARS.sub('', text)
+    text = _TRAILING_SPACE.sub('', text)
+    if text and not text.endswith('\n'):
+        text += '\n'
+    return text
+
+
+class PyPDF2Backend:
+    """Pure Python extraction with PyPDF2"""
+
+    name = 'pypdf2'
+
+    @staticmethod
+    def available():
+        return True
+
+    def __init__(self, file):
+        self.reader = PyPDF2.PdfReader(file)
+        self.page_count = len(self.reader.pages)
+
+    def page_text(self, index):
+        return self.reader.pages[index].extract_text() or ''
+
+    def close(self):
+        pass
+
+
+class PdfiumBackend:
+    """Extraction with PDFium through pypdfium2 (native code, several times faster)"""
+
+    name = 'pypdfium2'
+
+    @staticmethod
+    def available():
+        return importlib.util.find_spec('pypdfium2') is not None
+
+    def __init__(self, file):
+        import pypdfium2
+
+        # Load from memory: PDFium reads the source lazily and the caller
+        # may close the file before the document
+        self.document = pypdfium2.PdfDocument(file.read())
+        self.page_count = len(self.document)
+
+    def page_text(self, index):
+        page = self.document[index]
+        text_page = page.get_textpage()
+        try:
+            return text_page.get_text_range()
+        finally:
+            text_page.close()
+            page.close()
+
+    def close(self):
+        self.document.close()
+
+
+class PdfminerBackend:
+    """
+    Extraction with pdfminer.six layout analysis
+
+    Slower than PyPDF2, but groups characters into lines by position, which
+    helps PDFs whose content streams draw text out of reading order.
+    """
+
+    name = 'pdfminer'
+
+    # Layout hints: group characters into lines and words by position, but
+    # keep text boxes in drawing order (boxes_flow=None) like the other
+    # backends instead of reordering columns
+    LAYOUT = {'line_margin': 0.5, 'char_margin': 2.0, 'word_margin': 0.1, 'boxes_flow': None}
+
+    @staticmethod
+    def available():
+        return importlib.util.find_spec('pdfminer') is not None
+
+    def __init__(self, file):
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        self.resources = PDFResourceManager(caching=True)
+        # Page objects only hold the page tree; content is parsed in page_text
+        self.pages = list(PDFPage.get_pages(file))
+        self.page_count = len(self.pages)
+
+    def page_text(self, index):
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter
+
+        output = io.StringIO()
+        device = TextConverter(self.resources, output, laparams=LAParams(**self.LAYOUT))
+        try:
+            PDFPageInterpreter(self.resources, device).process_page(self.pages[index])
+        finally:
+            device.close()
+        return output.getvalue()
+
+    def close(self):
+        pass
+
+
+# Extraction backends by name
+BACKENDS = {backend.name: backend for backend in (PyPDF2Backend, PdfiumBackend, PdfminerBackend)}
+
+
+def register_backend(backend):
+    """
+    Register an extraction backend
+
+    Args:
+        backend: Class with a name, an available() static method, and
+                 page_count, page_text(index) and close() once constructed
+                 from a binary file object
+
+    Returns:
+        The backend class, so this can be used as a decorator
+    """
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+def available_backends():
+    """Get the names of the backends whose engine is installed."""
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def resolve_backend(name=None):
+    """
+    Get the backend class to extract with
+
+    Args:
+        name: Backend name, 'auto' for the fastest installed one, or None
+              for the PDF_BACKEND environment variable (default 'pypdf2')
+
+    Returns:
+        The backend class
+    """
+    name = name or os.environ.get('PDF_BACKEND') or DEFAULT_BACKEND
+    if name == 'auto':
+        name = next(name for name in BACKEND_PREFERENCE if BACKENDS[name].available())
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{name}' (choose from: auto, {', '.join(BACKENDS)})")
+    backend = BACKENDS[name]
+    if not backend.available():
+        raise ValueError(f"PDF backend '{name}' is not installed")
+    return backend
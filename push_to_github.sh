@@ -39,7 +39,7 @@ if [ $? -eq 0 ]; then
     echo "5. Configure:"
     echo "   - Name: travel-to-ics-converter"
     echo "   - Build Command: pip install -r requirements-production.txt"
-    echo "   - Start Command: gunicorn -w 4 -b 0.0.0.0:\$PORT web_app_production:app"
+    echo "   - Start Command: gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:\$PORT web_app_production:app"
     echo "6. Add Environment Variable:"
     echo "   - SECRET_KEY: (generate below)"
     echo ""
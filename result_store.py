@@ -0,0 +1,202 @@
+"""
+Server-side stores for parsed itineraries
+Keeps parse results by id with TTL expiry, LRU eviction and size caps
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from travel_to_ics import FlightInfo, HotelInfo
+
+
+def encode_itinerary(flights, hotels, **metadata):
+    """
+    Serialize parsed flights and hotels to compressed bytes
+
+    Args:
+        flights: List of FlightInfo
+        hotels: List of HotelInfo
+        **metadata: Extra JSON-safe values stored alongside (e.g. filename)
+    """
+    payload = dict(metadata)
+    payload['flights'] = FlightInfo.encode_many(flights)
+    payload['hotels'] = HotelInfo.encode_many(hotels)
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_itinerary(data):
+    """
+    Deserialize bytes from encode_itinerary
+
+    Returns:
+        dict: 'flights' and 'hotels' lists plus any stored metadata
+    """
+    payload = json.loads(zlib.decompress(data).decode('utf-8'))
+    payload['flights'] = FlightInfo.decode_many(payload['flights'])
+    payload['hotels'] = HotelInfo.decode_many(payload['hotels'])
+    return payload
+
+
+class MemoryResultStore:
+    """In-process store (only for a single worker process)"""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=3600):
+        """
+        Initialize the memory store
+
+        Args:
+            max_entries: Maximum number of entries kept
+            max_bytes: Maximum total payload size kept
+            ttl: Seconds before an entry expires
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get a payload, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, created = entry
+            if time.time() - created > self.ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, key, payload):
+        """Store a payload and evict least recently used entries over the caps."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, time.time())
+            self._size += len(payload)
+
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        """Remove a payload if present."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        payload, _ = self._entries.pop(key)
+        self._size -= len(payload)
+
+
+class SQLiteResultStore:
+    """On-disk store shared by all worker processes"""
+
+    def __init__(self, path=None, table='results', max_entries=1024,
+                 max_bytes=256 * 1024 * 1024, ttl=3600):
+        """
+        Initialize the SQLite store
+
+        Args:
+            path: SQLite database file (defaults to the system temp directory)
+            table: Table name, so several stores can share one file
+            max_entries: Maximum number of entries kept
+            max_bytes: Maximum total payload size kept
+            ttl: Seconds before an entry expires
+        """
+        self.path = path or os.path.join(tempfile.gettempdir(), 'travel_to_ics_results.sqlite3')
+        self.table = table
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        with self._connect() as conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                ' key TEXT PRIMARY KEY, payload BLOB NOT NULL,'
+                ' created REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        """Open a connection (one per call, so it is safe across forks)."""
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        """Get a payload, or None if missing or expired."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    f'SELECT payload, created FROM {self.table} WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                    return None
+                conn.execute(f'UPDATE {self.table} SET accessed = ? WHERE key = ?', (now, key))
+        finally:
+            conn.close()
+        return row[0]
+
+    def put(self, key, payload):
+        """Store a payload and evict expired or least recently used entries."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f'INSERT OR REPLACE INTO {self.table} (key, payload, created, accessed) '
+                    'VALUES (?, ?, ?, ?)',
+                    (key, payload, now, now)
+                )
+                conn.execute(f'DELETE FROM {self.table} WHERE created < ?', (now - self.ttl,))
+
+                # Keep the most recently used entries that fit within both caps
+                rows = conn.execute(
+                    f'SELECT key, LENGTH(payload) FROM {self.table} ORDER BY accessed DESC'
+                ).fetchall()
+                total = 0
+                evicted = []
+                for index, (row_key, size) in enumerate(rows):
+                    total += size
+                    if index >= self.max_entries or total > self.max_bytes:
+                        evicted.append((row_key,))
+                conn.executemany(f'DELETE FROM {self.table} WHERE key = ?', evicted)
+        finally:
+            conn.close()
+
+    def delete(self, key):
+        """Remove a payload if present."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+        finally:
+            conn.close()
+
+
+def create_result_store(backend='sqlite', path=None, **limits):
+    """
+    Create a result store
+
+    Args:
+        backend: 'sqlite' (shared between workers) or 'memory'
+        path: SQLite database file for the sqlite backend
+        **limits: max_entries, max_bytes and ttl for the store
+    """
+    if backend == 'memory':
+        return MemoryResultStore(**limits)
+    if backend == 'sqlite':
+        return SQLiteResultStore(path, **limits)
+    raise ValueError(f'Unknown result store backend: {backend}')
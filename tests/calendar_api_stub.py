@@ -0,0 +1,159 @@
+"""
+Local stub of the Google Calendar events API
+Serves single and batch (multipart/mixed) requests from memory, so event
+pushes can be tested without Google. Point GoogleCalendarIntegration's
+api_endpoint at CalendarAPIStub.url.
+"""
+
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+EVENTS_PATH = re.compile(r'(?:/calendar/v3)?/calendars/(?P<calendar>[^/]+)/events(?:/(?P<event_id>[^/?]+))?')
+
+
+class CalendarAPIStub:
+    """In-memory Calendar API server running on a background thread"""
+
+    def __init__(self):
+        self.events = {}
+        self.batches = 0
+        self.requests = 0
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f'http://127.0.0.1:{self._server.server_port}/'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail(self, summary, status, reason=None, times=None):
+        """
+        Make requests for an event fail
+
+        Args:
+            summary: Summary of the event whose requests fail
+            status: HTTP status to answer with
+            reason: Optional error reason (e.g. 'rateLimitExceeded')
+            times: Number of requests that fail (None fails all of them)
+        """
+        self._failures[summary] = [status, reason, times]
+
+    def _failure(self, summary):
+        with self._lock:
+            failure = self._failures.get(summary)
+            if not failure or failure[2] == 0:
+                return None
+            if failure[2] is not None:
+                failure[2] -= 1
+            return failure[0], failure[1]
+
+    def handle(self, method, path, body):
+        """
+        Answer one API call
+
+        Returns:
+            tuple: (status, response body dict or None)
+        """
+        with self._lock:
+            self.requests += 1
+        match = EVENTS_PATH.search(path)
+        if not match:
+            return 404, _error(404, 'notFound')
+
+        event_id = match.group('event_id')
+        summary = (body or {}).get('summary') or self.events.get(event_id, {}).get('summary')
+        failure = self._failure(summary)
+        if failure:
+            return failure[0], _error(*failure)
+
+        with self._lock:
+            if method == 'POST':
+                event_id = body.get('id') or uuid.uuid4().hex
+                if event_id in self.events:
+                    return 409, _error(409, 'duplicate')
+                self.events[event_id] = dict(body, id=event_id)
+                return 200, self.events[event_id]
+            if event_id not in self.events:
+                return 404, _error(404, 'notFound')
+            if method == 'PATCH':
+                self.events[event_id].update(body)
+                return 200, self.events[event_id]
+            if method == 'DELETE':
+                del self.events[event_id]
+                return 204, None
+            return 200, self.events[event_id]
+
+    def handle_batch(self, content_type, payload):
+        """Answer a multipart/mixed batch, returning (content type, body bytes)."""
+        with self._lock:
+            self.batches += 1
+        boundary = re.search(r'boundary="?([^";]+)', content_type).group(1)
+        parts = payload.split(f'--{boundary}'.encode())[1:-1]
+
+        response_boundary = f'batch_{uuid.uuid4().hex}'
+        chunks = []
+        for part in parts:
+            part = part.replace(b'\r\n', b'\n').strip(b'\n')
+            headers, _, request = part.partition(b'\n\n')
+            content_id = re.search(rb'Content-ID: <([^>]+)>', headers, re.IGNORECASE).group(1).decode()
+            request_line, _, rest = request.partition(b'\n')
+            method, path, _ = request_line.decode().split(' ', 2)
+            _, _, body = rest.partition(b'\n\n')
+
+            status, response = self.handle(method, path, json.loads(body) if body.strip() else None)
+            data = json.dumps(response).encode() if response is not None else b''
+            chunks.append(
+                f'--{response_boundary}\r\n'
+                f'Content-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} Stub\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(data)}\r\n\r\n'.encode() + data + b'\r\n'
+            )
+        chunks.append(f'--{response_boundary}--\r\n'.encode())
+        return f'multipart/mixed; boundary={response_boundary}', b''.join(chunks)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, content_type, data):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = self.rfile.read(length) if length else b''
+                if self.path.startswith('/batch'):
+                    content_type, data = stub.handle_batch(self.headers['Content-Type'], payload)
+                    self._reply(200, content_type, data)
+                    return
+                status, response = stub.handle(self.command, self.path,
+                                               json.loads(payload) if payload else None)
+                self._reply(status, 'application/json',
+                            json.dumps(response).encode() if response is not None else b'')
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _dispatch
+
+        return Handler
+
+
+def _error(status, reason):
+    """Build a Google API error response body."""
+    return {'error': {'code': status, 'message': reason or 'error',
+                      'errors': [{'reason': reason or 'error', 'message': reason or 'error'}]}}
@@ -0,0 +1,95 @@
+"""
+Concurrent push: retry rules and the shared rate limiters
+"""
+
+import json
+from datetime import datetime
+
+import httplib2
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+
+import calendar_push
+from calendar_api_stub import CalendarAPIStub
+from calendar_push import CalendarPushEngine, TokenBucket
+from google_calendar_integration import GoogleCalendarIntegration, is_retryable_error
+
+
+def http_error(status, reason):
+    content = json.dumps({'error': {'code': status, 'message': reason,
+                                    'errors': [{'reason': reason, 'message': reason}]}})
+    return HttpError(httplib2.Response({'status': status}), content.encode('utf-8'))
+
+
+@pytest.mark.parametrize('status, reason, retryable', [
+    (403, 'rateLimitExceeded', True),
+    (403, 'userRateLimitExceeded', True),
+    (403, 'forbidden', False),
+    (403, 'insufficientPermissions', False),
+    (429, 'rateLimitExceeded', True),
+    (503, 'backendError', True),
+    (400, 'invalid', False),
+])
+def test_retryable_errors(status, reason, retryable):
+    assert is_retryable_error(http_error(status, reason)) is retryable
+
+
+@pytest.fixture
+def stub():
+    stub = CalendarAPIStub().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def engine(stub, tmp_path, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_PATH', str(tmp_path / 'rate_limits.sqlite3'))
+    monkeypatch.setattr(calendar_push, 'project_bucket', TokenBucket('project', 1000, 1000))
+    monkeypatch.setattr(calendar_push, 'backoff_delay', lambda attempt: 0)
+
+    credentials_file = tmp_path / 'credentials.json'
+    credentials_file.write_text('{}')
+    gcal = GoogleCalendarIntegration(str(credentials_file), str(tmp_path / 'token.pickle'),
+                                     api_endpoint=stub.url)
+    gcal.creds = Credentials(token='test-token')
+    return CalendarPushEngine(gcal, max_workers=2, batch_size=5)
+
+
+def events(count):
+    return [
+        dict(summary=f'Event {index}', start_datetime=datetime(2026, 3, 23, 10),
+             end_datetime=datetime(2026, 3, 23, 11), timezone='America/Lima')
+        for index in range(count)
+    ]
+
+
+def test_rate_limited_items_are_retried(stub, engine):
+    stub.fail('Event 2', 403, 'rateLimitExceeded', times=2)
+
+    report = engine.push(events(12))
+
+    assert len(report['created']) == 12
+    assert report['retried'] == 2
+
+
+def test_permission_errors_are_not_retried(stub, engine):
+    stub.fail('Event 2', 403, 'insufficientPermissions')
+
+    report = engine.push(events(12))
+
+    assert len(report['created']) == 11
+    assert [item['index'] for item in report['failed']] == [2]
+    assert report['retried'] == 0
+
+
+def test_bucket_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'rate_limits.sqlite3')
+    # Two instances on one file stand in for two worker processes
+    first = TokenBucket('project', rate=1, capacity=5, path=path)
+    second = TokenBucket('project', rate=1, capacity=5, path=path)
+
+    first.acquire(5)
+
+    assert second._take(1) > 0.5
+    assert TokenBucket('other', rate=1, capacity=5, path=path)._take(1) == 0
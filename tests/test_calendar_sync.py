@@ -0,0 +1,86 @@
+"""
+Incremental sync against the local Calendar API stub, across logins
+"""
+
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+import calendar_push
+from calendar_api_stub import CalendarAPIStub
+from calendar_push import TokenBucket
+from calendar_sync import CalendarSync, SyncState, event_id
+from google_calendar_integration import GoogleCalendarIntegration
+
+
+def id_token(subject):
+    """Build an unsigned ID token carrying an account id."""
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+    return f"{encode({'alg': 'RS256'})}.{encode({'sub': subject})}.signature"
+
+
+@pytest.fixture
+def stub():
+    stub = CalendarAPIStub().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def login(stub, tmp_path, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_PATH', str(tmp_path / 'rate_limits.sqlite3'))
+    monkeypatch.setattr(calendar_push, 'project_bucket', TokenBucket('project', 1000, 1000))
+    credentials_file = tmp_path / 'credentials.json'
+    credentials_file.write_text('{}')
+
+    def login(access_token, subject='1234567890', refresh_token=None):
+        """Authorize like a fresh OAuth callback (new access token every time)."""
+        gcal = GoogleCalendarIntegration(str(credentials_file), str(tmp_path / 'token.pickle'),
+                                         api_endpoint=stub.url)
+        gcal.creds = Credentials(token=access_token, refresh_token=refresh_token,
+                                 id_token=id_token(subject) if subject else None)
+        return gcal
+    return login
+
+
+def trip_events(gcal, count):
+    return [
+        (event_id('trip', index), gcal.commute_event_data(
+            f'Leg {index}', datetime(2026, 3, 23, 8 + index), datetime(2026, 3, 23, 9 + index),
+            'America/Lima'))
+        for index in range(count)
+    ]
+
+
+def test_user_key_is_stable_across_logins(login):
+    first = login('access-1', refresh_token='refresh-1')
+    second = login('access-2')
+
+    assert first.user_key() == second.user_key()
+    assert login('access-3', subject='another').user_key() != first.user_key()
+
+
+def test_user_key_without_id_token_falls_back_to_tokens(login):
+    assert login('access-1', subject=None, refresh_token='refresh').user_key() == \
+        login('access-2', subject=None, refresh_token='refresh').user_key()
+
+
+def test_resync_after_login_only_sends_changes(stub, login, tmp_path):
+    state = SyncState(str(tmp_path / 'sync.sqlite3'))
+
+    gcal = login('access-1')
+    first = CalendarSync(gcal, state).sync('MQBJFAC', trip_events(gcal, 4))
+    assert first['inserted'] == 4
+
+    # No refresh token on a later login, so only the account id matches
+    gcal = login('access-2')
+    requests = stub.requests
+    second = CalendarSync(gcal, state).sync('MQBJFAC', trip_events(gcal, 3))
+
+    assert (second['inserted'], second['updated'], second['deleted'], second['unchanged']) == (0, 0, 1, 3)
+    assert stub.requests - requests == 1
+    assert len(stub.events) == 3
@@ -0,0 +1,95 @@
+"""
+Batch event creation against the local Calendar API stub
+"""
+
+from datetime import datetime
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+import google_calendar_integration
+from calendar_api_stub import CalendarAPIStub
+from google_calendar_integration import BATCH_SIZE, GoogleCalendarIntegration
+
+
+@pytest.fixture
+def stub():
+    stub = CalendarAPIStub().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Retry attempts that backed off, without sleeping."""
+    delays = []
+    monkeypatch.setattr(google_calendar_integration, 'backoff_delay',
+                        lambda attempt: delays.append(attempt) or 0)
+    return delays
+
+
+@pytest.fixture
+def gcal(stub, tmp_path, delays):
+    credentials_file = tmp_path / 'credentials.json'
+    credentials_file.write_text('{}')
+    gcal = GoogleCalendarIntegration(str(credentials_file), str(tmp_path / 'token.pickle'),
+                                     api_endpoint=stub.url)
+    gcal.creds = Credentials(token='test-token')
+    return gcal
+
+
+def events(count):
+    return [
+        dict(summary=f'Event {index}', start_datetime=datetime(2026, 3, 23, 10),
+             end_datetime=datetime(2026, 3, 23, 11), timezone='America/Lima')
+        for index in range(count)
+    ]
+
+
+def test_events_are_sent_in_batches(stub, gcal):
+    report = gcal.batch_create_events(events(BATCH_SIZE * 2 + 20))
+
+    assert stub.batches == 3
+    assert [event['summary'] for event in report['created']] == [
+        f'Event {index}' for index in range(BATCH_SIZE * 2 + 20)]
+    assert report['failed'] == []
+    assert report['retried'] == 0
+    assert len(stub.events) == BATCH_SIZE * 2 + 20
+
+
+def test_failed_items_are_reported_without_failing_the_batch(stub, gcal):
+    stub.fail('Event 5', 400, 'invalid')
+
+    report = gcal.batch_create_events(events(10))
+
+    assert len(report['created']) == 9
+    assert [(item['index'], item['summary']) for item in report['failed']] == [(5, 'Event 5')]
+    assert '400' in report['failed'][0]['error']
+    # Not retryable, so it's only sent once
+    assert report['retried'] == 0
+    assert stub.batches == 1
+
+
+def test_only_failed_items_are_retried(stub, gcal):
+    stub.fail('Event 3', 503, 'backendError', times=1)
+
+    report = gcal.batch_create_events(events(10))
+
+    assert [event['summary'] for event in report['created']] == [f'Event {index}' for index in range(10)]
+    assert report['failed'] == []
+    assert report['retried'] == 1
+    # The retry batch held just the failed item
+    assert stub.batches == 2
+    assert stub.requests == 11
+
+
+def test_retries_stop_after_max_retries(stub, gcal, delays):
+    stub.fail('Event 0', 503, 'backendError')
+
+    report = gcal.batch_create_events(events(2), max_retries=2)
+
+    assert [item['index'] for item in report['failed']] == [0]
+    assert report['retried'] == 2
+    assert stub.batches == 3
+    # Each retry round backs off first
+    assert delays == [1, 2]
@@ -0,0 +1,175 @@
+"""
+Golden-file tests for ICS output
+Both generators must write exactly the bytes in tests/golden/<case>.ics.
+After an intended output change, rewrite the files with:
+
+    UPDATE_GOLDEN=1 python -m pytest tests/test_ics_golden.py
+"""
+
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from custom_ics_generator import CustomICSGenerator
+from fast_ics_generator import FastICSGenerator
+from travel_to_ics import FlightInfo, HotelInfo
+
+
+GOLDEN_DIR = Path(__file__).parent / 'golden'
+
+
+def cwt_sample():
+    """The Santiago - Lima - Bogota trip of the sample CWT itinerary."""
+    ticket = dict(reservation_code='MQBJFAC', ticket_number='0456330284053')
+    flights = [
+        FlightInfo(flight_number='LA2696', origin='SCL', destination='LIM',
+                   departure_time=datetime(2026, 3, 23, 18, 30),
+                   arrival_time=datetime(2026, 3, 23, 20, 10), **ticket),
+        FlightInfo(flight_number='LA4905', origin='LIM', destination='BOG',
+                   departure_time=datetime(2026, 3, 24, 15, 55),
+                   arrival_time=datetime(2026, 3, 24, 19, 10), **ticket),
+        FlightInfo(flight_number='LA711', origin='BOG', destination='SCL',
+                   departure_time=datetime(2026, 3, 26, 22, 50),
+                   arrival_time=datetime(2026, 3, 27, 6, 35), **ticket),
+    ]
+    hotels = [
+        HotelInfo(name='CASA ANDINA PREMIUM SAN ISIDRO', checkin_date=datetime(2026, 3, 23),
+                  checkout_date=datetime(2026, 3, 24), confirmation_number='10066SF006058',
+                  address='Las Orquideas 505 527, San Isidro, PE', phone='51 1 3916500',
+                  details='Habitacion doble', timezone='America/Lima'),
+        HotelInfo(name='NH COLLECTION WTC ROYAL', checkin_date=datetime(2026, 3, 24),
+                  checkout_date=datetime(2026, 3, 26), confirmation_number='5596SF007871',
+                  address='Carrera 8a N 9955, World Trade Center, CO', phone='57 1 6341734',
+                  timezone='America/Bogota'),
+    ]
+    return flights, hotels, {}
+
+
+def new_year_trip():
+    """A trip over New Year, so VTIMEZONEs must cover two years (and a DST zone)."""
+    flights = [
+        FlightInfo(flight_number='LA800', origin='SCL', destination='MAD',
+                   departure_time=datetime(2026, 12, 30, 12, 0),
+                   arrival_time=datetime(2026, 12, 31, 6, 15), reservation_code='NYE2026'),
+        FlightInfo(flight_number='IB6833', origin='MAD', destination='SCL',
+                   departure_time=datetime(2027, 1, 3, 23, 55),
+                   arrival_time=datetime(2027, 1, 4, 9, 40), reservation_code='NYE2026'),
+    ]
+    hotels = [
+        HotelInfo(name='HOTEL EUROSTARS MADRID TOWER', checkin_date=datetime(2026, 12, 31),
+                  checkout_date=datetime(2027, 1, 3), timezone='Europe/Madrid'),
+    ]
+    return flights, hotels, {}
+
+
+def escaping_and_folding():
+    """Text that needs escaping, and lines folded next to multi-byte characters."""
+    flights = [
+        # Unknown airports fall back to UTC
+        FlightInfo(flight_number='XX1', origin='ZZZ', destination='YYY',
+                   departure_time=datetime(2026, 5, 1, 9, 0),
+                   arrival_time=datetime(2026, 5, 1, 11, 30),
+                   reservation_code='A,B;C\\D', ticket_number='9' * 90),
+    ]
+    hotels = [
+        HotelInfo(name='HOTEL "Ñandú", Suites; Piso 2\\3',
+                  checkin_date=datetime(2026, 5, 1), checkout_date=datetime(2026, 5, 3),
+                  confirmation_number='CONF-1',
+                  address='Av. Pardo Nº 123, 2º piso, Miraflores, Lima, Perú → frente al parque 日本',
+                  phone='+51 1 555 0100',
+                  details='Line one\nLine two\r\nLine three\\N' + 'é' * 40 + 'x' * 36 + '\\',
+                  timezone='America/Lima'),
+    ]
+    return flights, hotels, {}
+
+
+def custom_colors_and_times():
+    """Non-default colours and airport commute times."""
+    flights, hotels, _ = cwt_sample()
+    return flights, hotels, dict(
+        flight_color='3', hotel_color='1',
+        airport_times={'SCL_before': '1.5', 'SCL_after': '0.5', 'international_after': '2'})
+
+
+def long_itinerary():
+    """Enough events for iter_ical to yield several chunks."""
+    flights = []
+    hotels = []
+    start = datetime(2026, 2, 2, 7, 0)
+    route = ['SCL', 'LIM', 'BOG', 'MEX', 'JFK', 'MIA', 'GRU', 'EZE']
+    for index in range(40):
+        departure = start + timedelta(days=index, hours=index % 5)
+        flights.append(FlightInfo(
+            flight_number=f'LA{1000 + index}', origin=route[index % len(route)],
+            destination=route[(index + 1) % len(route)], departure_time=departure,
+            arrival_time=departure + timedelta(hours=3, minutes=15),
+            reservation_code='LONG01', ticket_number=f'045{index:010d}'))
+        if index % 3 == 0:
+            hotels.append(HotelInfo(
+                name=f'HOTEL NUMBER {index}', checkin_date=departure,
+                checkout_date=departure + timedelta(days=2),
+                confirmation_number=f'H{index}', timezone='America/Lima'))
+    return flights, hotels, {}
+
+
+CASES = {
+    'cwt_sample': cwt_sample,
+    'new_year_trip': new_year_trip,
+    'escaping_and_folding': escaping_and_folding,
+    'custom_colors_and_times': custom_colors_and_times,
+    'long_itinerary': long_itinerary,
+}
+
+
+def custom_ical(flights, hotels, options):
+    generator = CustomICSGenerator(**options)
+    generator.process_flights(list(flights))
+    for hotel in hotels:
+        generator.add_hotel_event(hotel)
+    return generator.to_ical()
+
+
+def golden(name, output):
+    """Get a case's golden file contents, writing them first with UPDATE_GOLDEN=1."""
+    path = GOLDEN_DIR / f'{name}.ics'
+    if os.environ.get('UPDATE_GOLDEN'):
+        GOLDEN_DIR.mkdir(exist_ok=True)
+        path.write_bytes(output)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize('name', CASES)
+def test_custom_generator_matches_golden(name):
+    flights, hotels, options = CASES[name]()
+    output = custom_ical(flights, hotels, options)
+    assert output == golden(name, output)
+
+
+@pytest.mark.parametrize('name', CASES)
+def test_fast_to_ical_matches_golden(name):
+    flights, hotels, options = CASES[name]()
+    generator = FastICSGenerator(**options)
+    generator.process_flights(list(flights))
+    for hotel in hotels:
+        generator.add_hotel_event(hotel)
+    assert generator.to_ical() == golden(name, custom_ical(flights, hotels, options))
+
+
+@pytest.mark.parametrize('name', CASES)
+@pytest.mark.parametrize('chunk_size', [1, 4096, 16 * 1024])
+def test_fast_iter_ical_matches_golden(name, chunk_size):
+    flights, hotels, options = CASES[name]()
+    chunks = list(FastICSGenerator(**options).iter_ical(flights, hotels, chunk_size=chunk_size))
+    assert b''.join(chunks) == golden(name, custom_ical(flights, hotels, options))
+    if chunk_size == 1:
+        assert len(chunks) > 2
+
+
+def test_ics_lines_are_folded():
+    flights, hotels, options = escaping_and_folding()
+    for line in golden('escaping_and_folding', custom_ical(flights, hotels, options)).split(b'\r\n'):
+        assert len(line) <= 75
+        # Folds never split a UTF-8 sequence
+        line.decode('utf-8')
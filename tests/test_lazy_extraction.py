@@ -0,0 +1,128 @@
+"""
+Lazy extraction: where the parser stops reading an itinerary PDF
+"""
+
+import logging
+
+from benchmark import synthetic_pdf
+from travel_to_ics import TravelPDFParser
+
+
+HEADER = ['Localizador: MQBJFAC', 'Viaje a Lima mar. 23 - mar. 27, 2026',
+          'Billete electrónico: 0456330284053']
+
+FLIGHT_1 = ['SALIDA lu., mar. 23 | 18:30', 'Santiago', 'Aeropuerto (SCL)',
+            'LLEGADA lu., mar. 23 | 20:10', 'Lima', 'Aeropuerto (LIM)',
+            'LAN AIRLINES LA 2696 CONFIRMADO']
+
+HOTEL_1 = ['ENTRADA', 'lu., mar. 23', 'SALIDA', 'ma., mar. 24',
+           'CASA ANDINA PREMIUM SAN ISIDRO CONFIRMADO',
+           'Confirmación de proveedor: 10066SF006058',
+           'Dirección: Las Orquideas 505 527, San Isidro, PE']
+
+FLIGHT_2 = ['SALIDA ma., mar. 24 | 15:55', 'Lima', 'Aeropuerto (LIM)',
+            'LLEGADA ma., mar. 24 | 19:10', 'Bogota', 'Aeropuerto (BOG)',
+            'LATAM AIRLINES LA 4905 CONFIRMADO']
+
+HOTEL_2 = ['ENTRADA', 'ma., mar. 24', 'SALIDA', 'ju., mar. 26',
+           'NH COLLECTION WTC ROYAL CONFIRMADO',
+           'Confirmación de proveedor: 5596SF007871',
+           'Dirección: Carrera 8a N 9955, World Trade Center, CO']
+
+NOTES = ['Notas importantes', 'Presente su pasaporte vigente en el mostrador.',
+         'El equipaje de mano no puede superar los 8 kg.']
+
+
+def itinerary_pdf(*pages):
+    """Build a PDF with one page per list of lines."""
+    size = max(len(lines) for lines in pages)
+    lines = [line for page in pages for line in page + [''] * (size - len(page))]
+    return synthetic_pdf(lines, len(pages))
+
+
+def parse(pdf, **options):
+    parser = TravelPDFParser(pdf, diagnostics=logging.INFO, **options)
+    return parser, parser.parse_flights(), parser.parse_hotels()
+
+
+def skipped_pages(parser):
+    return [diagnostic for diagnostic in parser.diagnostics if diagnostic.code == 'pages_skipped']
+
+
+def test_segments_after_pages_of_notes_are_read():
+    pdf = itinerary_pdf(HEADER + FLIGHT_1, HOTEL_1, NOTES, NOTES, FLIGHT_2 + HOTEL_2)
+
+    parser, flights, hotels = parse(pdf)
+
+    assert [flight.flight_number for flight in flights] == ['LA2696', 'LA4905']
+    assert [hotel.name for hotel in hotels] == ['CASA ANDINA PREMIUM SAN ISIDRO',
+                                                'NH COLLECTION WTC ROYAL']
+    assert parser.counters['pages'] == 5
+    assert skipped_pages(parser) == []
+
+
+def test_idle_pages_stop_is_opt_in_and_reported():
+    pdf = itinerary_pdf(HEADER + FLIGHT_1, HOTEL_1, NOTES, NOTES, FLIGHT_2 + HOTEL_2)
+
+    parser, flights, hotels = parse(pdf, idle_pages=2)
+
+    assert [flight.flight_number for flight in flights] == ['LA2696']
+    assert parser.counters['pages'] == 4
+    [diagnostic] = skipped_pages(parser)
+    assert diagnostic.level == logging.WARNING
+    assert diagnostic.message == 'Stopped reading after page 4 of 5 (2 pages without segments)'
+
+
+def test_terms_header_ends_the_itinerary():
+    pdf = itinerary_pdf(HEADER + FLIGHT_1, HOTEL_1 + ['Términos y condiciones'] + NOTES,
+                        FLIGHT_2, NOTES)
+
+    parser, flights, hotels = parse(pdf)
+
+    assert [flight.flight_number for flight in flights] == ['LA2696']
+    assert len(hotels) == 1
+    assert parser.counters['pages'] == 2
+    [diagnostic] = skipped_pages(parser)
+    assert diagnostic.level == logging.WARNING
+    assert diagnostic.message == ('Stopped reading after page 2 of 4'
+                                  ' (end of itinerary at "Términos y condiciones")')
+
+
+def test_header_stop_is_reported_at_the_default_level():
+    pdf = itinerary_pdf(HEADER + FLIGHT_1 + ['Reglas de tarifa'] + NOTES, FLIGHT_2)
+
+    parser = TravelPDFParser(pdf)
+
+    assert [diagnostic.code for diagnostic in parser.diagnostics] == ['pages_skipped']
+
+
+def test_note_line_starting_like_a_header_is_not_the_end():
+    note = ['Condiciones de transporte: consulte con la aerolínea antes de viajar.']
+    pdf = itinerary_pdf(HEADER + FLIGHT_1, note + HOTEL_1, FLIGHT_2 + HOTEL_2)
+
+    parser, flights, hotels = parse(pdf)
+
+    assert [flight.flight_number for flight in flights] == ['LA2696', 'LA4905']
+    assert len(hotels) == 2
+    assert skipped_pages(parser) == []
+
+
+def test_header_followed_by_segments_is_not_the_end():
+    pdf = itinerary_pdf(HEADER + FLIGHT_1, ['Reglas de tarifa'] + FLIGHT_2, HOTEL_2)
+
+    parser, flights, hotels = parse(pdf)
+
+    assert [flight.flight_number for flight in flights] == ['LA2696', 'LA4905']
+    assert len(hotels) == 1
+
+
+def test_last_header_on_a_page_ends_the_itinerary():
+    pdf = itinerary_pdf(HEADER + FLIGHT_1 + ['Reglas de tarifa'] + FLIGHT_2
+                        + ['Términos y condiciones'] + NOTES, NOTES, NOTES)
+
+    parser, flights, hotels = parse(pdf)
+
+    assert [flight.flight_number for flight in flights] == ['LA2696', 'LA4905']
+    assert parser.counters['pages'] == 1
+    [diagnostic] = skipped_pages(parser)
+    assert diagnostic.record.pages_read == 1
@@ -0,0 +1,41 @@
+"""
+Parse pool timeouts and worker recycling
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from parse_pool import ParsePool, ParseTimeout
+
+
+@pytest.fixture
+def pool():
+    pool = ParsePool(processes=1, max_pending=4, timeout=1)
+    # Start the worker before timing anything
+    pool.run(time.sleep, 0)
+    yield pool
+    pool.close()
+
+
+def test_queued_jobs_do_not_time_out(pool):
+    started_pool = pool._pool
+
+    with ThreadPoolExecutor(3) as executor:
+        results = list(executor.map(lambda _: pool.run(time.sleep, 0.6, wait=None), range(3)))
+
+    assert results == [None, None, None]
+    # No job was taken for stuck, so the pool was not replaced
+    assert pool._pool is started_pool
+    assert not pool._retired
+
+
+def test_stuck_job_times_out_and_retires_the_pool(pool):
+    stuck_pool = pool._pool
+
+    with pytest.raises(ParseTimeout):
+        pool.run(time.sleep, 3)
+
+    assert pool.run(time.sleep, 0) is None
+    assert pool._pool is not stuck_pool
@@ -0,0 +1,25 @@
+"""
+Text normalisation shared by the PDF extraction backends
+"""
+
+import pytest
+
+from pdf_backends import normalize_text
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('Línea 1\r\nLínea 2\rLínea 3\x0cLínea 4', 'Línea 1\nLínea 2\nLínea 3\nLínea 4\n'),
+    # Ideographic, no-break and narrow no-break spaces
+    ('SALIDA lu., mar. 23\u3000|\u00a018:30\u202fh', 'SALIDA lu., mar. 23 | 18:30 h\n'),
+    ('Con\ufb01rmado, o\ufb03ce, \ufb02ight', 'Confirmado, office, flight\n'),
+    # Decomposed accent
+    ('Direccio\u0301n', 'Dirección\n'),
+    ('Bil\u00adlete\u200b electrónico\ufeff   ', 'Billete electrónico\n'),
+])
+def test_normalize_text(raw, expected):
+    assert normalize_text(raw) == expected
+
+
+def test_symbols_are_kept_as_printed():
+    text = 'Av. Pardo Nº 123, 2º piso, 1ª planta, m² ½, ™\n'
+    assert normalize_text(text) == text
@@ -0,0 +1,40 @@
+"""
+Years of CWT itinerary dates, which only print day and month
+"""
+
+from datetime import datetime
+
+from benchmark import synthetic_pdf
+from travel_to_ics import TravelPDFParser
+
+
+def flight(date, number):
+    return [f'SALIDA {date} | 18:30', 'Santiago', 'Aeropuerto (SCL)',
+            f'LLEGADA {date} | 20:10', 'Lima', 'Aeropuerto (LIM)',
+            f'LAN AIRLINES LA {number} CONFIRMADO']
+
+
+def departures(*lines):
+    parser = TravelPDFParser(synthetic_pdf(list(lines), 1))
+    return [flight.departure_time for flight in parser.parse_flights()]
+
+
+def test_issue_date_before_later_month_flights():
+    assert departures('Localizador: MQBJFAC',
+                      'Fecha de emision: ma., feb. 10, 2026',
+                      *flight('lu., mar. 23', 2696)) == [datetime(2026, 3, 23, 18, 30)]
+
+
+def test_trip_over_new_year():
+    assert departures('Localizador: MQBJFAC',
+                      'Viaje a Lima dic. 30 - ene. 3, 2027',
+                      *flight('mi., dic. 30', 2696),
+                      *flight('do., ene. 3', 711)) == [datetime(2026, 12, 30, 18, 30),
+                                                        datetime(2027, 1, 3, 18, 30)]
+
+
+def test_street_number_is_not_a_year():
+    assert departures('Localizador: MQBJFAC',
+                      'Viaje a Lima mar. 23 - mar. 27, 2026',
+                      'Dirección: Calle 93, 2045 Lima',
+                      *flight('lu., mar. 23', 2696)) == [datetime(2026, 3, 23, 18, 30)]
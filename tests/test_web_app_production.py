@@ -0,0 +1,57 @@
+"""
+ICS downloads from the production web app
+"""
+
+import importlib
+from datetime import datetime
+
+import pytest
+
+from result_store import encode_itinerary
+from travel_to_ics import FlightInfo, HotelInfo
+
+
+@pytest.fixture
+def web_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESULT_STORE_PATH', str(tmp_path / 'results.sqlite3'))
+    monkeypatch.setenv('PARSE_CACHE_PATH', str(tmp_path / 'parse_cache.sqlite3'))
+    monkeypatch.setenv('JOB_STORE_PATH', str(tmp_path / 'jobs'))
+    module = importlib.reload(importlib.import_module('web_app_production'))
+    module.app.config['TESTING'] = True
+    yield module
+    module.parse_pool.close()
+
+
+def store_upload(web_app, session_id, hotel_timezone):
+    flights = [FlightInfo(flight_number='LA2696', origin='SCL', destination='LIM',
+                          departure_time=datetime(2026, 3, 23, 18, 30),
+                          arrival_time=datetime(2026, 3, 23, 20, 10))]
+    hotels = [HotelInfo(name='CASA ANDINA', checkin_date=datetime(2026, 3, 23),
+                        checkout_date=datetime(2026, 3, 24), timezone=hotel_timezone)]
+    web_app.result_store.put(session_id, encode_itinerary(flights, hotels, filename='trip.pdf'))
+
+
+def test_generate_streams_the_calendar(web_app):
+    store_upload(web_app, 'good', 'America/Lima')
+
+    response = web_app.app.test_client().post('/generate', data={'session_id': 'good'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == 'attachment; filename=trip.ics'
+    assert response.data.count(b'BEGIN:VEVENT') >= 2
+    assert response.data.endswith(b'END:VCALENDAR\r\n')
+
+
+def test_generate_errors_redirect_before_the_download_starts(web_app):
+    store_upload(web_app, 'broken', 'Not/AZone')
+    client = web_app.app.test_client()
+
+    response = client.post('/generate', data={'session_id': 'broken'})
+
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        [(category, message)] = session['_flashes']
+    assert category == 'error'
+    assert message.startswith('Error generating ICS file:')
+    # The upload is kept, so the settings can be changed and tried again
+    assert web_app.result_store.get('broken') is not None
@@ -4,12 +4,21 @@ Travel PDF to ICS Calendar Converter
 Converts travel agent PDFs into Google Calendar ICS files with flight and hotel appointments.
 """
 
+import io
+import logging
 import re
-from datetime import datetime, timedelta
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
 from zoneinfo import ZoneInfo
-from icalendar import Calendar, Event, Alarm
-import PyPDF2
+from icalendar import Calendar, Event, Alarm, Timezone
 from pathlib import Path
+from pdf_backends import normalize_text, resolve_backend
+
+
+# Bump when parsing output changes so cached results are invalidated
+PARSER_VERSION = '4'
 
 
 # Airport timezone mapping (major airports)
@@ -56,69 +65,683 @@ AIRPORT_TIMEZONES = {
 }
 
 
-class FlightInfo:
-    def __init__(self):
-        self.flight_number = None
-        self.origin = None
-        self.destination = None
-        self.departure_time = None
-        self.arrival_time = None
-        self.reservation_code = None
-        self.ticket_number = None
+# Spanish month abbreviations used in CWT dates
+SPANISH_MONTHS = {
+    'ene': 1, 'feb': 2, 'mar': 3, 'abr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'ago': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dic': 12
+}
 
+# English month abbreviations used in English itineraries and e-tickets
+ENGLISH_MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
 
-class HotelInfo:
-    def __init__(self):
-        self.name = None
-        self.checkin_date = None
-        self.checkout_date = None
-        self.confirmation_number = None
-        self.address = None
-        self.phone = None
-        self.details = None
-        self.timezone = None
+# Compiled parsing rules for the CWT Spanish itinerary format, keyed by rule name
+CWT_RULES = {
+    'localizador': re.compile(r'Localizador:\s*([A-Z0-9]+)'),
+    'ticket_number': re.compile(r'Billete electrónico:\s*(\d+)'),
+    'traveller': re.compile(r'(?:Viajero|Pasajero):\s*([^\n]+)'),
+    'flight_confirmation': re.compile(
+        r'(?:LAN AIRLINES|LATAM AIRLINES|AVIANCA|SKY|COPA AIRLINES)\s+([A-Z]{2}\s*\d{3,4})\s+CONFIRMADO',
+        re.IGNORECASE),
+    'departure': re.compile(r'SALIDA\s+([a-z]+\.,\s+[a-z]+\.\s+\d+)\s*\|\s*(\d{1,2}:\d{2})', re.IGNORECASE),
+    'arrival': re.compile(r'LLEGADA\s+([a-z]+\.,\s+[a-z]+\.\s+\d+)\s*\|\s*(\d{1,2}:\d{2})', re.IGNORECASE),
+    'origin_airport': re.compile(r'SALIDA.*?\n.*?\n.*?\(([A-Z]{3})\)', re.DOTALL),
+    'destination_airport': re.compile(r'LLEGADA.*?\n.*?\n.*?\(([A-Z]{3})\)', re.DOTALL),
+    'hotel_confirmation': re.compile(
+        r'(CASA ANDINA|NH COLLECTION|HOTEL|MARRIOTT|HILTON|HYATT|SHERATON|RADISSON|IBIS|HOLIDAY INN)([^\n]*?)\s+CONFIRMADO',
+        re.IGNORECASE),
+    'supplier_confirmation': re.compile(r'Confirmación de proveedor:\s*([A-Z0-9]+)'),
+    'address': re.compile(r'Dirección:\s*([^\n]+)'),
+    'phone': re.compile(r'Teléfono:\s*([^\n]+)'),
+    'checkin': re.compile(r'ENTRADA\s*\n\s*([a-z]+\.,\s+[a-z]+\.\s+\d+)\s*\n', re.IGNORECASE),
+    'checkout': re.compile(r'SALIDA\s*\n\s*([a-z]+\.,\s+[a-z]+\.\s+\d+)\s*\n', re.IGNORECASE),
+    'room_description': re.compile(r'Descripción de la tarifa:\s*([^\n]+(?:\n(?!Notas:)[^\n]+)*)'),
+    'date': re.compile(r'[a-z]+\.,\s+([a-z]+)\.\s+(\d+)', re.IGNORECASE),
+    'time': re.compile(r'(\d{1,2}):(\d{2})'),
+    # Year after a date, e.g. "mar. 27, 2026" (the month is checked against the format's)
+    'year': re.compile(r'\b([a-z]{3})[a-z]*\.?\s+\d{1,2},\s*(\d{4})\b', re.IGNORECASE),
+    # End date of a range before the year, e.g. "- ene. 3" in "dic. 28 - ene. 3, 2027"
+    'year_range_end': re.compile(r'(?:[-–—]|\bal)\s*(?:[a-z]+\.,\s*)?([a-z]+)\.\s+\d+\s*$',
+                                 re.IGNORECASE),
+    # Header of the terms and fare rules that follow the itinerary, on a line
+    # of its own (a note line starting with these words is not a header)
+    'itinerary_end': re.compile(
+        r'^[ \t]*(?:Términos y condiciones|Condiciones generales|Reglas de (?:la )?tarifa|'
+        r'Condiciones de transporte|Política de privacidad)[ \t]*:?[ \t]*$',
+        re.IGNORECASE | re.MULTILINE),
+}
+
+# End of itinerary header for English documents (see the itinerary_end rule)
+ENGLISH_ITINERARY_END = re.compile(
+    r'^[ \t]*(?:Terms and conditions|General conditions|Fare rules|'
+    r'Conditions of (?:carriage|contract)|Privacy policy)[ \t]*:?[ \t]*$',
+    re.IGNORECASE | re.MULTILINE)
+
+# Registry of parsing rule sets by agency format name
+PARSING_RULES = {
+    'cwt': CWT_RULES,
+}
+
+
+def register_rules(format_name, rules):
+    """
+    Register parsing rules for an alternative agency format.
+
+    Args:
+        format_name: Name used to select the rules (e.g. 'cwt')
+        rules: Dict of rule name to pattern string or compiled pattern.
+               Rules that are not given fall back to the CWT rules.
+
+    Returns:
+        dict: The compiled rule set
+    """
+    compiled = {
+        name: re.compile(pattern) if isinstance(pattern, str) else pattern
+        for name, pattern in rules.items()
+    }
+    PARSING_RULES[format_name] = {**CWT_RULES, **compiled}
+    _LEXERS.pop(format_name, None)
+    return PARSING_RULES[format_name]
+
+
+# Segment token emitted by the itinerary lexer, with offsets into the text
+Token = namedtuple('Token', ['kind', 'start', 'end', 'match'])
+
+# Token kinds recognised in a single pass, mapped to the rule that matches them
+TOKEN_RULES = (
+    ('localizador', 'localizador'),
+    ('flight', 'flight_confirmation'),
+    ('hotel', 'hotel_confirmation'),
+    ('departure', 'departure'),
+    ('arrival', 'arrival'),
+    ('checkin', 'checkin'),
+    ('checkout', 'checkout'),
+)
+
+# Combined lexer pattern per format name, built on first use
+_LEXERS = {}
+
+
+def _get_lexer(format_name):
+    """Get the combined token pattern for a rule set."""
+    if format_name not in _LEXERS:
+        rules = PARSING_RULES[format_name]
+        alternatives = []
+        for kind, rule_name in TOKEN_RULES:
+            pattern = rules[rule_name]
+            # Scope each rule's flags to its own alternative
+            flags = ''
+            if pattern.flags & re.IGNORECASE:
+                flags += 'i'
+            if pattern.flags & re.DOTALL:
+                flags += 's'
+            if pattern.flags & re.MULTILINE:
+                flags += 'm'
+            body = f'(?{flags}:{pattern.pattern})' if flags else pattern.pattern
+            alternatives.append(f'(?P<{kind}>{body})')
+        _LEXERS[format_name] = re.compile('|'.join(alternatives))
+    return _LEXERS[format_name]
+
+
+# Document format plugin: how to recognise it and how its text is laid out.
+# markers are checked on the start of the text only, to pick a format cheaply.
+# layout 'blocks' has details before each CONFIRMED line (CWT), 'rows' has
+# one flight_segment rule match per flight (e-tickets, airline confirmations).
+ItineraryFormat = namedtuple('ItineraryFormat', ['name', 'markers', 'months', 'layout'])
+
+# Registry of format plugins by name, in detection priority order
+FORMATS = {}
+
+# Format used when no markers match, or for rule sets without a plugin
+DEFAULT_FORMAT = 'cwt'
+
+# Characters from the start of the text used for format detection (about a page)
+FINGERPRINT_WINDOW = 4096
+
+# Pages read at most per PDF, so oversized uploads cannot tie up a worker
+MAX_PAGES = 200
+
+
+def register_format(format_name, rules, markers, months=SPANISH_MONTHS, layout='blocks'):
+    """
+    Register a document format plugin.
+
+    Args:
+        format_name: Name used to select the format (e.g. 'cwt-en')
+        rules: Parsing rules, as for register_rules
+        markers: Patterns typical of the format's first page
+        months: Month abbreviation (first three letters) to number
+        layout: 'blocks' or 'rows' (see ItineraryFormat)
+
+    Returns:
+        ItineraryFormat: The registered plugin
+    """
+    register_rules(format_name, rules)
+    FORMATS[format_name] = ItineraryFormat(
+        format_name,
+        tuple(re.compile(marker) if isinstance(marker, str) else marker for marker in markers),
+        months,
+        layout
+    )
+    return FORMATS[format_name]
+
+
+def detect_format(text):
+    """
+    Pick the format whose markers best match the start of a document.
+
+    Args:
+        text: Document text (only the first FINGERPRINT_WINDOW characters are used)
+
+    Returns:
+        str: Format name (DEFAULT_FORMAT if nothing matches)
+    """
+    head = text[:FINGERPRINT_WINDOW]
+    best_name, best_score = DEFAULT_FORMAT, 0
+    for itinerary_format in FORMATS.values():
+        score = sum(1 for marker in itinerary_format.markers if marker.search(head))
+        if score > best_score:
+            best_name, best_score = itinerary_format.name, score
+    return best_name
+
+
+# CWT itineraries in Spanish
+register_format('cwt', CWT_RULES, markers=[
+    r'Localizador:',
+    r'Billete electrónico:',
+    r'\bCONFIRMADO\b',
+    r'\b(?:SALIDA|LLEGADA)\s+[a-z]+\.,',
+])
+
+# CWT itineraries in English
+CWT_EN_DATE = r'[a-z]+\.?,\s+[a-z]+\.?\s+\d+'
+register_format('cwt-en', {
+    'localizador': r'(?:Record locator|Booking reference):\s*([A-Z0-9]+)',
+    'ticket_number': r'E-?ticket(?: number)?:\s*(\d+)',
+    'traveller': r'(?:Traveler|Traveller|Passenger):\s*([^\n]+)',
+    # Any airline name, then an IATA flight number
+    'flight_confirmation': re.compile(
+        r'^[A-Z][A-Z .&\'-]*?\s+((?:[A-Z]{2}|[A-Z]\d|\d[A-Z])\s*\d{1,4})\s+CONFIRMED\b',
+        re.MULTILINE),
+    'departure': re.compile(rf'DEPARTURE\s+({CWT_EN_DATE})\s*\|\s*(\d{{1,2}}:\d{{2}})', re.IGNORECASE),
+    'arrival': re.compile(rf'ARRIVAL\s+({CWT_EN_DATE})\s*\|\s*(\d{{1,2}}:\d{{2}})', re.IGNORECASE),
+    'origin_airport': re.compile(r'DEPARTURE.*?\n.*?\n.*?\(([A-Z]{3})\)', re.DOTALL),
+    'destination_airport': re.compile(r'ARRIVAL.*?\n.*?\n.*?\(([A-Z]{3})\)', re.DOTALL),
+    # Any property name (flight lines are matched first by the lexer)
+    'hotel_confirmation': re.compile(r'^([A-Z][A-Z0-9 .&\'-]*?)()\s+CONFIRMED\b', re.MULTILINE),
+    'supplier_confirmation': r'Supplier confirmation:\s*([A-Z0-9]+)',
+    'address': r'Address:\s*([^\n]+)',
+    'phone': r'Phone:\s*([^\n]+)',
+    'checkin': re.compile(rf'CHECK-IN\s*\n\s*({CWT_EN_DATE})\s*\n', re.IGNORECASE),
+    'checkout': re.compile(rf'CHECK-OUT\s*\n\s*({CWT_EN_DATE})\s*\n', re.IGNORECASE),
+    'room_description': r'Rate description:\s*([^\n]+(?:\n(?!Notes:)[^\n]+)*)',
+    'date': re.compile(r'[a-z]+\.?,\s+([a-z]+)\.?\s+(\d+)', re.IGNORECASE),
+    'year_range_end': re.compile(r'(?:[-–—]|\bto)\s*(?:[a-z]+\.?,\s*)?([a-z]+)\.?\s+\d+\s*$',
+                                 re.IGNORECASE),
+    'itinerary_end': ENGLISH_ITINERARY_END,
+}, markers=[
+    r'Record locator:',
+    r'E-?ticket(?: number)?:',
+    r'\bCONFIRMED\b',
+    r'\b(?:DEPARTURE|ARRIVAL)\s+[A-Za-z]+\.?,',
+], months=ENGLISH_MONTHS)
+
+# Amadeus / Sabre electronic ticket receipts: one itinerary row per flight, e.g.
+# "SANTIAGO (SCL) LIMA (LIM) LA 2696 Y 23MAR 1830 2010 OK"
+register_format('eticket', {
+    'localizador': r'(?:BOOKING REF(?:ERENCE)?|RESERVATION (?:CODE|NUMBER)|RECORD LOCATOR)\s*:?\s*([A-Z0-9]{5,8})\b',
+    'ticket_number': r'TICKET NUMBER\s*:?\s*(\d{3}[\s-]?\d{10})',
+    'traveller': r'(?:PASSENGER|NAME)\s*:\s*([^\n]+)',
+    'issue_date': r'(?:DATE OF ISSUE|ISSUE DATE|ISSUED)\s*:?\s*(?P<day>\d{1,2})\s*(?P<month>[A-Z]{3})\s*(?P<year>\d{2,4})',
+    'flight_segment': re.compile(
+        r'\((?P<origin>[A-Z]{3})\)[^\n(]*?\((?P<destination>[A-Z]{3})\)\s+'
+        r'(?P<flight>(?:[A-Z]{2}|[A-Z]\d|\d[A-Z])\s*\d{1,4})\s+[A-Z]\s+'
+        r'(?P<day>\d{1,2})(?P<month>[A-Z]{3})\s+'
+        r'(?P<departure>\d{4})\s+(?P<arrival>\d{4})(?:\s*\+(?P<day_offset>\d))?'),
+    'year_range_end': r'(?!)',
+    'itinerary_end': ENGLISH_ITINERARY_END,
+}, markers=[
+    r'ELECTRONIC TICKET',
+    r'(?:ITINERARY|PASSENGER) RECEIPT',
+    r'TICKET NUMBER',
+    r'BOOKING REF|RECORD LOCATOR',
+], months=ENGLISH_MONTHS, layout='rows')
+
+# Airline booking confirmation e-mails, e.g.
+# "Flight LA 2696 / Santiago (SCL) to Lima (LIM) / Departs: Mon 23 Mar 2026 18:30 / Arrives: ..."
+AIRLINE_DATE = r'(?:[A-Za-z]{{3}}[a-z]*,?\s+)?(?P<{0}day>\d{{1,2}})\s+(?P<{0}month>[A-Za-z]{{3}})[a-z]*\.?,?\s+(?P<{0}year>\d{{4}})'
+register_format('airline', {
+    'localizador': r'(?:Confirmation|Booking|Reservation) (?:code|number|reference)\s*:?\s*([A-Z0-9]{5,8})\b',
+    'ticket_number': r'(?:E-?ticket|Ticket) number\s*:?\s*(\d{13})',
+    'traveller': r'(?:Passenger|Traveller|Traveler)\s*:\s*([^\n]+)',
+    'flight_segment': re.compile(
+        r'Flight:?\s+(?P<flight>(?:[A-Z]{2}|[A-Z]\d|\d[A-Z])\s*\d{1,4})[^\n]*\n'
+        r'[^\n]*?\((?P<origin>[A-Z]{3})\)[^\n]*?\((?P<destination>[A-Z]{3})\)[^\n]*\n'
+        r'\s*Depart(?:s|ure|ing)?:?\s+' + AIRLINE_DATE.format('') + r'\s+(?:at\s+)?(?P<departure>\d{1,2}:\d{2})[^\n]*\n'
+        r'\s*Arriv(?:es|al|ing)?:?\s+' + AIRLINE_DATE.format('arrival_') + r'\s+(?:at\s+)?(?P<arrival>\d{1,2}:\d{2})',
+        re.IGNORECASE),
+    'year_range_end': r'(?!)',
+    'itinerary_end': ENGLISH_ITINERARY_END,
+}, markers=[
+    r'(?i)(?:confirmation|booking|reservation) (?:code|number|reference)',
+    r'(?i)\bDepart(?:s|ure|ing)?:',
+    r'(?i)\bArriv(?:es|al|ing)?:',
+    r'(?i)\bFlight:?\s+(?:[A-Z]{2}|[A-Z]\d|\d[A-Z])\s*\d{1,4}\b',
+], months=ENGLISH_MONTHS, layout='rows')
+
+
+class _Record:
+    """Immutable slotted record with a compact, versioned list encoding"""
+
+    __slots__ = ()
+
+    # Bump when fields change so stale encoded data is rejected
+    ENCODING_VERSION = 1
+    DATETIME_FIELDS = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"Unknown {type(self).__name__} fields: {', '.join(fields)}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable, use replace()')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __reduce__(self):
+        # Rebuild through __init__ since attributes can't be set after creation
+        return (_decode_record, (type(self), self._values()))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __hash__(self):
+        return hash((type(self), tuple(self._values())))
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+    def _values(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def replace(self, **changes):
+        """Get a copy with some fields changed."""
+        return type(self)(**{**dict(zip(self.__slots__, self._values())), **changes})
+
+    def _encode_values(self):
+        """Get field values with datetimes as ISO strings."""
+        values = self._values()
+        for index in self._datetime_indexes():
+            if values[index] is not None:
+                values[index] = values[index].isoformat()
+        return values
+
+    @classmethod
+    def _datetime_indexes(cls):
+        return [cls.__slots__.index(name) for name in cls.DATETIME_FIELDS]
+
+    @classmethod
+    def _decode_values(cls, values, datetime_indexes):
+        values = list(values)
+        for index in datetime_indexes:
+            if values[index] is not None:
+                values[index] = datetime.fromisoformat(values[index])
+        return _decode_record(cls, values)
+
+    def encode(self):
+        """Encode as a JSON-safe list: [version, field values...]."""
+        return [self.ENCODING_VERSION] + self._encode_values()
+
+    @classmethod
+    def decode(cls, data):
+        """Rebuild a record from encode() output."""
+        return cls.decode_many([data[0], data[1:]])[0]
+
+    @classmethod
+    def encode_many(cls, records):
+        """Encode a list of records as [version, [field values...], ...]."""
+        return [cls.ENCODING_VERSION] + [record._encode_values() for record in records]
+
+    @classmethod
+    def decode_many(cls, data):
+        """Rebuild a list of records from encode_many() output."""
+        if not data:
+            return []
+        if data[0] != cls.ENCODING_VERSION:
+            raise ValueError(f'Unsupported {cls.__name__} encoding version: {data[0]}')
+        datetime_indexes = cls._datetime_indexes()
+        return [cls._decode_values(values, datetime_indexes) for values in data[1:]]
+
+
+def _decode_record(cls, values):
+    """Create a record from field values in slot order."""
+    return cls(**dict(zip(cls.__slots__, values)))
+
+
+class FlightInfo(_Record):
+    __slots__ = ('flight_number', 'origin', 'destination', 'departure_time',
+                 'arrival_time', 'reservation_code', 'ticket_number')
+    DATETIME_FIELDS = ('departure_time', 'arrival_time')
+
+
+class HotelInfo(_Record):
+    __slots__ = ('name', 'checkin_date', 'checkout_date', 'confirmation_number',
+                 'address', 'phone', 'details', 'timezone')
+    DATETIME_FIELDS = ('checkin_date', 'checkout_date')
+
+
+# Where lazy extraction stopped: pages read, pages in the PDF, and why
+SkippedPages = namedtuple('SkippedPages', ['pages_read', 'page_count', 'reason'])
+
+
+class Diagnostic(namedtuple('Diagnostic', ['level', 'code', 'record', 'missing'])):
+    """
+    Parser diagnostic about one segment, or about pages left unread
+
+    level is a logging level, code one of 'flight_parsed', 'flight_incomplete',
+    'hotel_parsed', 'hotel_incomplete' or 'pages_skipped', record the
+    FlightInfo, HotelInfo or SkippedPages and missing the names of required
+    fields that were not found. The message is only formatted when asked for.
+    """
+
+    __slots__ = ()
+
+    @property
+    def segment(self):
+        """Flight number or hotel name the diagnostic is about."""
+        return getattr(self.record, 'flight_number', None) or getattr(self.record, 'name', None)
+
+    @property
+    def message(self):
+        record = self.record
+        if self.code == 'flight_parsed':
+            return (f"Parsed flight: {record.flight_number} {record.origin} → {record.destination}"
+                    f" (departure {record.departure_time}, arrival {record.arrival_time})")
+        if self.code == 'hotel_parsed':
+            return (f"Parsed hotel: {record.name} (check-in {record.checkin_date},"
+                    f" check-out {record.checkout_date}, timezone {record.timezone})")
+        if self.code == 'pages_skipped':
+            return (f"Stopped reading after page {record.pages_read} of {record.page_count}"
+                    f" ({record.reason})")
+        kind = 'flight' if self.code.startswith('flight') else 'hotel'
+        return f"Incomplete {kind} data for {self.segment} (missing: {', '.join(self.missing)})"
+
+    def to_dict(self):
+        """Get the diagnostic as JSON-safe data."""
+        return {
+            'level': logging.getLevelName(self.level),
+            'code': self.code,
+            'segment': self.segment,
+            'missing': list(self.missing),
+            'message': self.message,
+        }
+
+
+class _NonClosingStream:
+    """Context manager that hands out a stream without closing it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __enter__(self):
+        return self.stream
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class PageLimitExceeded(ValueError):
+    """Raised when the itinerary runs past the parser's max_pages"""
 
 
 class TravelPDFParser:
-    def __init__(self, pdf_path):
+    def __init__(self, pdf_path, rules='auto', progress=None, diagnostics=logging.WARNING,
+                 lazy=True, max_pages=MAX_PAGES, backend=None, idle_pages=None):
+        # A file path, the PDF bytes, or a binary file-like object
         self.pdf_path = pdf_path
+        # Text extraction engine: a name from pdf_backends.BACKENDS, 'auto',
+        # or None for the PDF_BACKEND environment variable (default PyPDF2)
+        self.backend = resolve_backend(backend)
+        # Optional callback(pages_done, page_count) called as pages are extracted
+        self.progress = progress
+        # Lowest logging level of Diagnostic records collected (None collects none)
+        self.diagnostics_level = diagnostics
+        self.diagnostics = []
+        # Work done, for instrumentation: pages decoded and full-text regex passes
+        self.counters = {'pages': 0, 'regex_scans': 0}
+        # Lazy extraction stops at the end of the itinerary instead of
+        # decoding every page; reading more than max_pages pages is an error
+        self.lazy = lazy
+        self.max_pages = max_pages
+        # Opt-in: also stop lazy extraction after this many pages without
+        # segments (None reads on until the itinerary_end header)
+        self.idle_pages = idle_pages
+        self.page_count = None
+        # 'auto' picks the format from the first page's markers
+        self._format_choice = rules
+        self.format_name = None
         self.text = self._extract_text()
+        if self.format_name is None:
+            # No pages were read
+            self._select_format(self.text)
+        self._tokens = None
+        self._years = None
+
+    def _select_format(self, first_page):
+        """Set the format and its rules, detecting the format from the first page if 'auto'."""
+        rules = self._format_choice
+        self.format_name = detect_format(first_page) if rules == 'auto' else rules
+        self.rules = PARSING_RULES[self.format_name]
+        self.format = FORMATS.get(self.format_name) or ItineraryFormat(
+            self.format_name, (), SPANISH_MONTHS, 'blocks')
+
+    def _count_scans(self, scans=1):
+        """Count passes of a regex over the whole document text (for instrumentation)."""
+        self.counters['regex_scans'] += scans
+
+    def _open_pdf(self):
+        """Open the PDF source as a binary file object."""
+        if isinstance(self.pdf_path, (bytes, bytearray)):
+            return io.BytesIO(self.pdf_path)
+        if hasattr(self.pdf_path, 'read'):
+            # Caller owns the stream, so don't close it when done
+            return _NonClosingStream(self.pdf_path)
+        return open(self.pdf_path, 'rb')
+
+    def _iter_page_texts(self):
+        """Yield the normalised text of each PDF page, decoding a page only when it is asked for."""
+        with self._open_pdf() as file:
+            document = self.backend(file)
+            try:
+                page_count = document.page_count
+                self.page_count = page_count
+                for page_number in range(1, page_count + 1):
+                    if self.max_pages and page_number > self.max_pages:
+                        raise PageLimitExceeded(
+                            f'PDF itinerary is longer than {self.max_pages} pages')
+                    text = normalize_text(document.page_text(page_number - 1))
+                    self.counters['pages'] += 1
+                    if self.progress:
+                        self.progress(page_number, page_count)
+                    yield text
+            finally:
+                document.close()
+
+    def _has_segments(self, text):
+        """Check whether text holds a flight or hotel segment of the format."""
+        if self.format.layout == 'rows':
+            return self.rules['flight_segment'].search(text) is not None
+        return (self.rules['flight_confirmation'].search(text) is not None
+                or self.rules['hotel_confirmation'].search(text) is not None)
+
+    def _itinerary_end(self, page_text, seen_segments):
+        """
+        Find where the itinerary ends on a page.
+
+        Args:
+            page_text: Text of the page
+            seen_segments: Whether earlier pages had segments
+
+        Returns:
+            Match of the first itinerary_end header with segments before it
+            (on this page or earlier ones) and none after it, or None
+        """
+        for end_match in self.rules['itinerary_end'].finditer(page_text):
+            if self._has_segments(page_text[end_match.end():]):
+                continue
+            if seen_segments or self._has_segments(page_text[:end_match.start()]):
+                return end_match
+            return None
+        return None
 
     def _extract_text(self):
-        """Extract text from PDF file."""
-        text = ""
-        with open(self.pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        return text
-
-    def _parse_spanish_date(self, date_str, time_str):
-        """Parse Spanish date format like 'lu., mar. 23' with time '18:30'."""
-        # Month mapping
-        spanish_months = {
-            'ene': 1, 'feb': 2, 'mar': 3, 'abr': 4, 'may': 5, 'jun': 6,
-            'jul': 7, 'ago': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dic': 12
-        }
-
+        """
+        Extract the itinerary text from the PDF.
+
+        In lazy mode extraction stops once the itinerary has ended: at a
+        terms or fare rules header (the itinerary_end rule) with no segments
+        after it on its page, or, if idle_pages is set, after that many
+        pages without segments. Both only count after a segment has been
+        seen, so cover pages and notices are read. Stopping before the last
+        page is recorded as a 'pages_skipped' warning.
+        """
+        texts = []
+        seen_segments = False
+        idle_pages = 0
+        skipped = None
+        pages = self._iter_page_texts()
+        try:
+            for page_text in pages:
+                if self.format_name is None:
+                    self._select_format(page_text)
+                if not self.lazy:
+                    texts.append(page_text)
+                    continue
+
+                end_match = self._itinerary_end(page_text, seen_segments)
+                if end_match:
+                    texts.append(page_text[:end_match.start()])
+                    skipped = f'end of itinerary at "{end_match.group().strip()}"'
+                    break
+                texts.append(page_text)
+
+                if self._has_segments(page_text):
+                    seen_segments = True
+                    idle_pages = 0
+                elif seen_segments and self.idle_pages:
+                    idle_pages += 1
+                    if idle_pages >= self.idle_pages:
+                        skipped = f'{idle_pages} pages without segments'
+                        break
+        finally:
+            pages.close()
+
+        if skipped and self.counters['pages'] < self.page_count:
+            self._diagnose(logging.WARNING, 'pages_skipped',
+                           SkippedPages(self.counters['pages'], self.page_count, skipped))
+
+        # Join once instead of growing a string page by page
+        return ''.join(texts)
+
+    def tokenize(self):
+        """
+        Split the text into typed segment tokens in a single pass.
+
+        Returns:
+            dict: Token kind to list of Token tuples, in text order
+        """
+        if self._tokens is None:
+            self._tokens = {kind: [] for kind, _ in TOKEN_RULES}
+            rule_names = dict(TOKEN_RULES)
+            self._count_scans()
+            for lex_match in _get_lexer(self.format_name).finditer(self.text):
+                kind = lex_match.lastgroup
+                # Re-match the single rule in place to get its own groups
+                match = self.rules[rule_names[kind]].match(self.text, lex_match.start())
+                self._tokens[kind].append(Token(kind, match.start(), match.end(), match))
+            self._token_starts = {
+                kind: [token.start for token in tokens]
+                for kind, tokens in self._tokens.items()
+            }
+        return self._tokens
+
+    def _tokens_between(self, kind, start, end):
+        """Get tokens of a kind that start within [start, end)."""
+        tokens = self.tokenize()[kind]
+        starts = self._token_starts[kind]
+        return tokens[bisect_left(starts, start):bisect_left(starts, end)]
+
+    def _document_years(self):
+        """
+        Find the trip years mentioned in the text, scanning it only once.
+
+        Returns:
+            list: (position, year, range end month or None) tuples in text order
+        """
+        if self._years is None:
+            self._years = []
+            self._count_scans()
+            for year_match in self.rules['year'].finditer(self.text):
+                # Only years of dates count, not street numbers like "Calle 93, 2045"
+                if not self._month(year_match.group(1)):
+                    continue
+                year = int(year_match.group(2))
+                if not 2000 <= year <= 2099:
+                    continue
+                # Month of a range's end date, e.g. "ene." in "dic. 28 - ene. 3, 2027";
+                # a single date like an issue date is not a range
+                start = self.text.rindex(',', year_match.start(), year_match.start(2))
+                end_match = self.rules['year_range_end'].search(self.text, max(0, start - 32), start)
+                end_month = self._month(end_match.group(1)) if end_match else None
+                self._years.append((start, year, end_month))
+            self._year_starts = [position for position, _, _ in self._years]
+        return self._years
+
+    def _resolve_year(self, month, pos=None):
+        """Get the year for a date at a text position, handling Dec to Jan trips."""
+        years = self._document_years()
+        if not years:
+            return datetime.now().year
+
+        # Use the closest year mentioned before the segment, else the first one
+        index = 0
+        if pos is not None:
+            index = max(bisect_left(self._year_starts, pos) - 1, 0)
+        _, year, end_month = years[index]
+
+        # A trip ending in January lists December dates under the previous year
+        if end_month and month > end_month:
+            year -= 1
+        return year
+
+    def _month(self, name):
+        """Get a month number from its name in the document's language, or None."""
+        return self.format.months.get(name[:3].lower())
+
+    def _parse_date(self, date_str, time_str, pos=None):
+        """Parse a date like 'lu., mar. 23' (or 'Mon., Mar. 23') with time '18:30'."""
         # Extract month and day from patterns like "lu., mar. 23" or "ma., mar. 24"
-        match = re.search(r'[a-z]+\.,\s+([a-z]+)\.\s+(\d+)', date_str, re.IGNORECASE)
+        match = self.rules['date'].search(date_str)
         if not match:
             return None
 
-        month_abbr = match.group(1).lower()
         day = int(match.group(2))
 
-        # Get year from text (look for pattern "mar. 23 - mar. 27, 2026")
-        year_match = re.search(r',\s*(\d{4})', self.text)
-        year = int(year_match.group(1)) if year_match else datetime.now().year
-
-        month = spanish_months.get(month_abbr)
+        month = self._month(match.group(1))
         if not month:
             return None
 
+        # Get year from text (look for pattern "mar. 23 - mar. 27, 2026")
+        year = self._resolve_year(month, pos)
+
         # Parse time
-        time_match = re.match(r'(\d{1,2}):(\d{2})', time_str)
+        time_match = self.rules['time'].match(time_str)
         if not time_match:
             return None
 
@@ -127,16 +750,28 @@ class TravelPDFParser:
 
         return datetime(year, month, day, hour, minute)
 
+    def parse_traveller(self):
+        """Get the traveller name from the PDF text, if present."""
+        self._count_scans()
+        traveller_match = self.rules['traveller'].search(self.text)
+        return traveller_match.group(1).strip() if traveller_match else None
+
     def parse_flights(self):
-        """Parse flight information from PDF text (CWT format)."""
+        """Parse flight information from PDF text, in the detected format's layout."""
+        if self.format.layout == 'rows':
+            return self._parse_flight_rows()
+
         flights = []
 
+        tokens = self.tokenize()
+
         # Get the main booking reference (Localizador) from the top
-        localizador_match = re.search(r'Localizador:\s*([A-Z0-9]+)', self.text)
-        main_localizador = localizador_match.group(1) if localizador_match else None
+        localizadores = tokens['localizador']
+        main_localizador = localizadores[0].match.group(1) if localizadores else None
 
         # Get the ticket number (Billete electrónico)
-        ticket_match = re.search(r'Billete electrónico:\s*(\d+)', self.text)
+        self._count_scans()
+        ticket_match = self.rules['ticket_number'].search(self.text)
         ticket_number = ticket_match.group(1) if ticket_match else None
 
         # In CWT format, flight details come BEFORE the airline/flight number line
@@ -144,57 +779,147 @@ class TravelPDFParser:
         # We need to look backwards from the confirmation line
 
         # Find all "AIRLINE FLIGHTNO CONFIRMADO" lines
-        confirmation_pattern = r'(?:LAN AIRLINES|LATAM AIRLINES|AVIANCA|SKY|COPA AIRLINES)\s+([A-Z]{2}\s*\d{3,4})\s+CONFIRMADO'
-        confirmations = list(re.finditer(confirmation_pattern, self.text, re.IGNORECASE))
+        confirmations = tokens['flight']
 
-        for i, conf_match in enumerate(confirmations):
-            flight = FlightInfo()
-            flight.flight_number = conf_match.group(1).replace(' ', '')
-            flight.reservation_code = main_localizador
-            flight.ticket_number = ticket_number
+        for i, confirmation in enumerate(confirmations):
+            fields = {
+                'flight_number': confirmation.match.group(1).replace(' ', ''),
+                'reservation_code': main_localizador,
+                'ticket_number': ticket_number,
+            }
 
-            # Find the text BEFORE this confirmation (from previous confirmation or start)
-            start_pos = confirmations[i-1].end() if i > 0 else 0
-            end_pos = conf_match.start()
-            flight_text = self.text[start_pos:end_pos]
+            # Use the text BEFORE this confirmation (from previous confirmation or start)
+            start_pos = confirmations[i-1].end if i > 0 else 0
+            end_pos = confirmation.start
 
             # Extract departure info: "lu., mar. 23 | 18:30"
-            departure_match = re.search(r'SALIDA\s+([a-z]+\.,\s+[a-z]+\.\s+\d+)\s*\|\s*(\d{1,2}:\d{2})', flight_text, re.IGNORECASE)
-            if departure_match:
-                flight.departure_time = self._parse_spanish_date(departure_match.group(1), departure_match.group(2))
+            departures = self._tokens_between('departure', start_pos, end_pos)
+            if departures:
+                departure_match = departures[0].match
+                fields['departure_time'] = self._parse_date(
+                    departure_match.group(1), departure_match.group(2), departures[0].start)
 
             # Extract arrival info: "lu., mar. 23 | 20:10"
-            arrival_match = re.search(r'LLEGADA\s+([a-z]+\.,\s+[a-z]+\.\s+\d+)\s*\|\s*(\d{1,2}:\d{2})', flight_text, re.IGNORECASE)
-            if arrival_match:
-                flight.arrival_time = self._parse_spanish_date(arrival_match.group(1), arrival_match.group(2))
+            arrivals = self._tokens_between('arrival', start_pos, end_pos)
+            if arrivals:
+                arrival_match = arrivals[0].match
+                fields['arrival_time'] = self._parse_date(
+                    arrival_match.group(1), arrival_match.group(2), arrivals[0].start)
 
             # Extract origin airport from departure section
-            origin_match = re.search(r'SALIDA.*?\n.*?\n.*?\(([A-Z]{3})\)', flight_text, re.DOTALL)
+            origin_match = self.rules['origin_airport'].search(self.text, start_pos, end_pos)
             if origin_match:
-                flight.origin = origin_match.group(1)
+                fields['origin'] = origin_match.group(1)
 
             # Extract destination airport from arrival section
-            dest_match = re.search(r'LLEGADA.*?\n.*?\n.*?\(([A-Z]{3})\)', flight_text, re.DOTALL)
+            dest_match = self.rules['destination_airport'].search(self.text, start_pos, end_pos)
             if dest_match:
-                flight.destination = dest_match.group(1)
-
-            # Validate we have all required info
-            if all([flight.flight_number, flight.origin, flight.destination,
-                   flight.departure_time, flight.arrival_time]):
-                flights.append(flight)
-                print(f"✓ Parsed flight: {flight.flight_number} {flight.origin} → {flight.destination}")
-                print(f"  Departure: {flight.departure_time}")
-                print(f"  Arrival: {flight.arrival_time}")
-            else:
-                print(f"⚠ Incomplete flight data for {flight.flight_number}")
-                if not flight.departure_time:
-                    print(f"  Missing: departure_time")
-                if not flight.arrival_time:
-                    print(f"  Missing: arrival_time")
-                if not flight.origin:
-                    print(f"  Missing: origin")
-                if not flight.destination:
-                    print(f"  Missing: destination")
+                fields['destination'] = dest_match.group(1)
+
+            self._add_flight(flights, FlightInfo(**fields))
+
+        return flights
+
+    def _diagnose(self, level, code, record, missing=()):
+        """Record a Diagnostic if its level is collected."""
+        if self.diagnostics_level is not None and level >= self.diagnostics_level:
+            self.diagnostics.append(Diagnostic(level, code, record, missing))
+
+    def _add_flight(self, flights, flight):
+        """Append a parsed flight to the list if it has all required info."""
+        if all([flight.flight_number, flight.origin, flight.destination,
+               flight.departure_time, flight.arrival_time]):
+            flights.append(flight)
+            self._diagnose(logging.INFO, 'flight_parsed', flight)
+        else:
+            missing = tuple(name for name in ('departure_time', 'arrival_time', 'origin', 'destination')
+                            if not getattr(flight, name))
+            self._diagnose(logging.WARNING, 'flight_incomplete', flight, missing)
+
+    def _segment_datetime(self, day, month_name, year, time_str, pos, issued=None):
+        """
+        Build a datetime from the date parts of a flight_segment match.
+
+        Args:
+            day: Day of month string
+            month_name: Month name or abbreviation
+            year: Year string (two or four digits), or None
+            time_str: Time as 'HH:MM' or 'HHMM'
+            pos: Text position of the segment, to resolve a missing year
+            issued: Ticket issue date; dates without a year fall on or after it
+
+        Returns:
+            datetime or None if the date is invalid
+        """
+        month = self._month(month_name)
+        if not month:
+            return None
+
+        if year:
+            year = int(year)
+            if year < 100:
+                year += 2000
+        elif issued:
+            year = issued.year + ((month, int(day)) < (issued.month, issued.day))
+        else:
+            year = self._resolve_year(month, pos)
+
+        digits = time_str.replace(':', '')
+        try:
+            return datetime(year, month, int(day), int(digits[:-2]), int(digits[-2:]))
+        except ValueError:
+            return None
+
+    def _parse_flight_rows(self):
+        """Parse flights from itineraries with one flight_segment match per flight."""
+        flights = []
+
+        self._count_scans(2)
+        localizador_match = self.rules['localizador'].search(self.text)
+        ticket_match = self.rules['ticket_number'].search(self.text)
+
+        # E-tickets give day and month only, so anchor them to the issue date
+        issued = None
+        issue_match = None
+        if 'issue_date' in self.rules:
+            self._count_scans()
+            issue_match = self.rules['issue_date'].search(self.text)
+        if issue_match:
+            issued = self._segment_datetime(issue_match.group('day'), issue_match.group('month'),
+                                            issue_match.group('year'), '0000', issue_match.start())
+
+        self._count_scans()
+        for match in self.rules['flight_segment'].finditer(self.text):
+            segment = match.groupdict()
+            departure_time = self._segment_datetime(
+                segment['day'], segment['month'], segment.get('year'),
+                segment['departure'], match.start(), issued)
+
+            arrival_time = None
+            if segment.get('arrival_day'):
+                arrival_time = self._segment_datetime(
+                    segment['arrival_day'], segment['arrival_month'], segment.get('arrival_year'),
+                    segment['arrival'], match.start(), issued)
+            elif departure_time:
+                # Same-day arrival unless marked "+1" (or earlier than departure)
+                arrival_time = self._segment_datetime(
+                    segment['day'], segment['month'], segment.get('year'),
+                    segment['arrival'], match.start(), issued)
+                if arrival_time:
+                    day_offset = int(segment.get('day_offset') or 0)
+                    if not day_offset and arrival_time < departure_time:
+                        day_offset = 1
+                    arrival_time += timedelta(days=day_offset)
+
+            self._add_flight(flights, FlightInfo(
+                flight_number=segment['flight'].replace(' ', ''),
+                reservation_code=localizador_match.group(1) if localizador_match else None,
+                ticket_number=ticket_match.group(1).replace(' ', '').replace('-', '') if ticket_match else None,
+                origin=segment['origin'],
+                destination=segment['destination'],
+                departure_time=departure_time,
+                arrival_time=arrival_time,
+            ))
 
         return flights
 
@@ -204,100 +929,177 @@ class TravelPDFParser:
 
         # In CWT format, hotel dates (ENTRADA/SALIDA) come BEFORE the hotel name
         # Similar to flights
-        # Pattern to find hotel confirmation lines
-        hotel_pattern = r'(CASA ANDINA|NH COLLECTION|HOTEL|MARRIOTT|HILTON|HYATT|SHERATON|RADISSON|IBIS|HOLIDAY INN)([^\n]*?)\s+CONFIRMADO'
+        # Find hotel confirmation lines
+        hotel_tokens = self.tokenize()['hotel']
 
-        hotel_matches = list(re.finditer(hotel_pattern, self.text, re.IGNORECASE))
+        for i, token in enumerate(hotel_tokens):
+            match = token.match
+            fields = {'name': (match.group(1) + match.group(2)).strip()}
 
-        for i, match in enumerate(hotel_matches):
-            hotel = HotelInfo()
-            hotel.name = (match.group(1) + match.group(2)).strip()
-
-            # Get text BEFORE this hotel name (from previous hotel or start of section)
-            # and AFTER (for details)
-            start_pos = hotel_matches[i-1].end() if i > 0 else 0
-            end_pos = hotel_matches[i+1].start() if i < len(hotel_matches) - 1 else len(self.text)
-
-            # Text before hotel name (for dates)
-            before_text = self.text[start_pos:match.start()]
-            # Text after hotel name (for details)
-            after_text = self.text[match.end():end_pos]
+            # Text BEFORE this hotel name (from previous hotel or start of section)
+            # holds the dates, text AFTER it holds the details
+            start_pos = hotel_tokens[i-1].end if i > 0 else 0
+            end_pos = hotel_tokens[i+1].start if i < len(hotel_tokens) - 1 else len(self.text)
 
             # Extract confirmation number
-            conf_match = re.search(r'Confirmación de proveedor:\s*([A-Z0-9]+)', after_text)
+            conf_match = self.rules['supplier_confirmation'].search(self.text, token.end, end_pos)
             if conf_match:
-                hotel.confirmation_number = conf_match.group(1)
+                fields['confirmation_number'] = conf_match.group(1)
 
             # Extract address
-            address_match = re.search(r'Dirección:\s*([^\n]+)', after_text)
+            address_match = self.rules['address'].search(self.text, token.end, end_pos)
             if address_match:
-                hotel.address = address_match.group(1).strip()
+                fields['address'] = address_match.group(1).strip()
 
             # Extract phone
-            phone_match = re.search(r'Teléfono:\s*([^\n]+)', after_text)
+            phone_match = self.rules['phone'].search(self.text, token.end, end_pos)
             if phone_match:
-                hotel.phone = phone_match.group(1).strip()
+                fields['phone'] = phone_match.group(1).strip()
 
             # Extract check-in date (ENTRADA) - look in text BEFORE hotel name
             # Pattern: "ENTRADA\nlu., mar. 23" (no time, just date on next line followed by newline)
             # This ensures we don't match flight dates which have " | HH:MM" after
             # Need to find the LAST occurrence (closest to hotel name)
-            checkin_matches = list(re.finditer(r'ENTRADA\s*\n\s*([a-z]+\.,\s+[a-z]+\.\s+\d+)\s*\n', before_text, re.IGNORECASE))
-            if checkin_matches:
+            checkin_tokens = self._tokens_between('checkin', start_pos, token.start)
+            if checkin_tokens:
                 # Take the last match (closest to hotel name)
-                checkin_date = self._parse_spanish_date(checkin_matches[-1].group(1), "15:00")
+                checkin_date = self._parse_date(
+                    checkin_tokens[-1].match.group(1), "15:00", checkin_tokens[-1].start)
                 if checkin_date:
-                    hotel.checkin_date = checkin_date
+                    fields['checkin_date'] = checkin_date
 
             # Extract check-out date (SALIDA) - look in text BEFORE hotel name
             # Make sure it's a hotel SALIDA (no time) not a flight SALIDA (has time with |)
             # Pattern must have newline after date, not " | time"
             # Need to find the LAST occurrence (closest to hotel name) and ensure it's the hotel one
-            salida_matches = list(re.finditer(r'SALIDA\s*\n\s*([a-z]+\.,\s+[a-z]+\.\s+\d+)\s*\n', before_text, re.IGNORECASE))
-            if salida_matches:
+            salida_tokens = self._tokens_between('checkout', start_pos, token.start)
+            if salida_tokens:
                 # Take the last match (closest to hotel name)
-                checkout_date = self._parse_spanish_date(salida_matches[-1].group(1), "12:00")
+                checkout_date = self._parse_date(
+                    salida_tokens[-1].match.group(1), "12:00", salida_tokens[-1].start)
                 if checkout_date:
-                    hotel.checkout_date = checkout_date
+                    fields['checkout_date'] = checkout_date
 
             # Extract room description for details
-            room_desc_match = re.search(r'Descripción de la tarifa:\s*([^\n]+(?:\n(?!Notas:)[^\n]+)*)', after_text)
+            room_desc_match = self.rules['room_description'].search(self.text, token.end, end_pos)
             if room_desc_match:
-                hotel.details = room_desc_match.group(1).strip()
+                fields['details'] = room_desc_match.group(1).strip()
 
             # Determine timezone from city in address or hotel name
-            if hotel.address:
-                address_upper = hotel.address.upper()
-                if 'LIMA' in address_upper or 'SAN ISIDRO' in address_upper or ', PE' in hotel.address:
-                    hotel.timezone = 'America/Lima'
-                elif 'BOGOTA' in address_upper or 'BOGOTÁ' in address_upper or ', CO' in hotel.address:
-                    hotel.timezone = 'America/Bogota'
-                elif 'SANTIAGO' in address_upper or ', CL' in hotel.address:
-                    hotel.timezone = 'America/Santiago'
-                elif 'BUENOS AIRES' in address_upper or ', AR' in hotel.address:
-                    hotel.timezone = 'America/Argentina/Buenos_Aires'
+            address = fields.get('address')
+            if address:
+                address_upper = address.upper()
+                if 'LIMA' in address_upper or 'SAN ISIDRO' in address_upper or ', PE' in address:
+                    fields['timezone'] = 'America/Lima'
+                elif 'BOGOTA' in address_upper or 'BOGOTÁ' in address_upper or ', CO' in address:
+                    fields['timezone'] = 'America/Bogota'
+                elif 'SANTIAGO' in address_upper or ', CL' in address:
+                    fields['timezone'] = 'America/Santiago'
+                elif 'BUENOS AIRES' in address_upper or ', AR' in address:
+                    fields['timezone'] = 'America/Argentina/Buenos_Aires'
                 else:
-                    hotel.timezone = 'UTC'
+                    fields['timezone'] = 'UTC'
             else:
-                hotel.timezone = 'UTC'
+                fields['timezone'] = 'UTC'
+
+            hotel = HotelInfo(**fields)
 
             # Validate we have required info
             if all([hotel.name, hotel.checkin_date, hotel.checkout_date, hotel.timezone]):
                 hotels.append(hotel)
-                print(f"✓ Parsed hotel: {hotel.name}")
-                print(f"  Check-in: {hotel.checkin_date}")
-                print(f"  Check-out: {hotel.checkout_date}")
-                print(f"  Timezone: {hotel.timezone}")
+                self._diagnose(logging.INFO, 'hotel_parsed', hotel)
             else:
-                print(f"⚠ Incomplete hotel data for {hotel.name}")
-                if not hotel.checkin_date:
-                    print(f"  Missing: checkin_date")
-                if not hotel.checkout_date:
-                    print(f"  Missing: checkout_date")
+                missing = tuple(name for name in ('checkin_date', 'checkout_date')
+                                if not getattr(hotel, name))
+                self._diagnose(logging.WARNING, 'hotel_incomplete', hotel, missing)
 
         return hotels
 
 
+# Longest layover at the same airport still treated as a connection
+CONNECTION_MAX_LAYOVER = timedelta(hours=12)
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """Get the ZoneInfo for a timezone name (resolved once per process)."""
+    return ZoneInfo(name)
+
+
+# Zone ids icalendar writes as UTC ("Z" suffix, no TZID) as equivalent to UTC
+UTC_ZONE_IDS = frozenset({
+    'UTC', 'UCT', 'Universal', 'Zulu', 'GMT', 'GMT+0', 'GMT-0', 'GMT0', 'Greenwich',
+    'Etc/UTC', 'Etc/UCT', 'Etc/Universal', 'Etc/Zulu', 'Etc/GMT', 'Etc/GMT+0',
+    'Etc/GMT-0', 'Etc/GMT0', 'Etc/Greenwich', 'Iceland', 'Atlantic/Reykjavik',
+    'Atlantic/St_Helena', 'Africa/Abidjan', 'Africa/Accra', 'Africa/Bamako',
+    'Africa/Banjul', 'Africa/Conakry', 'Africa/Dakar', 'Africa/Freetown', 'Africa/Lome',
+    'Africa/Nouakchott', 'Africa/Ouagadougou', 'Africa/Timbuktu',
+})
+
+
+@lru_cache(maxsize=256)
+def vtimezone(tzid, first_year, last_year):
+    """
+    Get the VTIMEZONE component for a zone (built once per zone and year range)
+
+    Args:
+        tzid: Timezone name
+        first_year: First year the component must cover
+        last_year: Last year the component must cover
+
+    Returns:
+        Timezone: Component with the zone's transitions in those years
+    """
+    return Timezone.from_tzinfo(get_zone(tzid), tzid=tzid, first_date=date(first_year, 1, 1),
+                                last_date=date(last_year + 1, 1, 1))
+
+
+# Flight on the normalised timeline: aware local times in each airport's zone,
+# the same instants in UTC, and whether commutes are needed around it
+TimelineLeg = namedtuple('TimelineLeg', [
+    'flight', 'origin_tz', 'destination_tz', 'departure', 'arrival',
+    'departure_utc', 'arrival_utc', 'commute_before', 'commute_after'
+])
+
+
+def build_timeline(flights):
+    """
+    Normalise flights onto a UTC timeline
+
+    Each leg's zones are resolved once and its local times converted to UTC,
+    so layovers between legs in different timezones are measured correctly.
+    A commute is needed before a leg unless it connects from the previous
+    one, and after a leg unless it connects to the next one.
+
+    Args:
+        flights: List of FlightInfo
+
+    Returns:
+        list: TimelineLeg per flight, in departure order
+    """
+    legs = []
+    for flight in flights:
+        origin_tz = get_zone(AIRPORT_TIMEZONES.get(flight.origin, 'UTC'))
+        destination_tz = get_zone(AIRPORT_TIMEZONES.get(flight.destination, 'UTC'))
+        departure = flight.departure_time.replace(tzinfo=origin_tz)
+        arrival = flight.arrival_time.replace(tzinfo=destination_tz)
+        legs.append((flight, origin_tz, destination_tz, departure, arrival,
+                     departure.astimezone(timezone.utc), arrival.astimezone(timezone.utc)))
+    legs.sort(key=lambda leg: leg[5])
+
+    connects = [
+        leg[0].destination == next_leg[0].origin
+        and next_leg[5] - leg[6] < CONNECTION_MAX_LAYOVER
+        for leg, next_leg in zip(legs, legs[1:])
+    ]
+    return [
+        TimelineLeg(*leg,
+                    commute_before=not (i > 0 and connects[i - 1]),
+                    commute_after=not (i < len(connects) and connects[i]))
+        for i, leg in enumerate(legs)
+    ]
+
+
 class ICSGenerator:
     def __init__(self):
         self.calendar = Calendar()
@@ -306,6 +1108,25 @@ class ICSGenerator:
         self.calendar.add('calscale', 'GREGORIAN')
         self.calendar.add('method', 'PUBLISH')
 
+        # Zones written with a TZID and the years of all event times, for VTIMEZONEs
+        self.tzids = set()
+        self.years = None
+
+    def use_zones(self, *values):
+        """Record the zones and years of datetimes written to the calendar."""
+        for value in values:
+            tzid = value.tzinfo.key
+            if tzid not in UTC_ZONE_IDS:
+                self.tzids.add(tzid)
+            if self.years is None:
+                self.years = (value.year, value.year)
+            else:
+                self.years = (min(self.years[0], value.year), max(self.years[1], value.year))
+
+    def timezone_components(self):
+        """Get one VTIMEZONE per zone used, covering the calendar's years."""
+        return [vtimezone(tzid, *self.years) for tzid in sorted(self.tzids)]
+
     def get_timezone(self, airport_code):
         """Get timezone for airport code."""
         return AIRPORT_TIMEZONES.get(airport_code, 'UTC')
@@ -333,14 +1154,15 @@ class ICSGenerator:
         event.add('description', description)
 
         # Start and end times with proper timezones
-        origin_tz = ZoneInfo(self.get_timezone(flight.origin))
-        dest_tz = ZoneInfo(self.get_timezone(flight.destination))
+        origin_tz = get_zone(self.get_timezone(flight.origin))
+        dest_tz = get_zone(self.get_timezone(flight.destination))
 
         dtstart = flight.departure_time.replace(tzinfo=origin_tz)
         dtend = flight.arrival_time.replace(tzinfo=dest_tz)
 
         event.add('dtstart', dtstart)
         event.add('dtend', dtend)
+        self.use_zones(dtstart, dtend)
 
         # Color - Using both standard and Google-specific properties
         # Flamingo color in Google Calendar
@@ -373,12 +1195,13 @@ class ICSGenerator:
             event.add('description', description)
 
         # Use the provided timezone
-        tz = ZoneInfo(timezone_str)
+        tz = get_zone(timezone_str)
         dtstart = start_time.replace(tzinfo=tz)
         dtend = end_time.replace(tzinfo=tz)
 
         event.add('dtstart', dtstart)
         event.add('dtend', dtend)
+        self.use_zones(dtstart, dtend)
 
         # Color - Using both standard and Google-specific properties
         # Flamingo color in Google Calendar
@@ -416,7 +1239,7 @@ class ICSGenerator:
         event.add('description', '\n'.join(description))
 
         # Set timezone for hotel location
-        tz = ZoneInfo(hotel.timezone)
+        tz = get_zone(hotel.timezone)
 
         # Check-in: 3:00 PM on check-in date
         checkin = hotel.checkin_date.replace(hour=15, minute=0, second=0, microsecond=0, tzinfo=tz)
@@ -425,6 +1248,7 @@ class ICSGenerator:
 
         event.add('dtstart', checkin)
         event.add('dtend', checkout)
+        self.use_zones(checkin, checkout)
 
         # Color - Using both standard and Google-specific properties
         # Sage color in Google Calendar
@@ -443,28 +1267,23 @@ class ICSGenerator:
 
     def process_flights(self, flights):
         """Process all flights and add events with commute times."""
+        for _ in self.iter_process_flights(flights):
+            pass
+
+    def iter_process_flights(self, flights):
+        """Add flight and commute events like process_flights, yielding after each leg."""
         if not flights:
             return
 
         # Sort flights by departure time
-        flights.sort(key=lambda f: f.departure_time)
-
-        for i, flight in enumerate(flights):
-            # Check if this is a connecting flight
-            is_first_leg = (i == 0)
-            is_last_leg = (i == len(flights) - 1)
-
-            is_connection = False
-            if not is_last_leg:
-                next_flight = flights[i + 1]
-                # Check if connection (same airport, less than 12 hours)
-                if (flight.destination == next_flight.origin and
-                    (next_flight.departure_time - flight.arrival_time) < timedelta(hours=12)):
-                    is_connection = True
-
-            # Add "commute & airport" before flight (only if first leg or not a connection)
-            if is_first_leg or not is_connection:
-                origin_tz = self.get_timezone(flight.origin)
+        timeline = build_timeline(flights)
+        flights[:] = [leg.flight for leg in timeline]
+
+        for leg in timeline:
+            flight = leg.flight
+
+            # Add "commute & airport" before flight (unless connecting from the previous leg)
+            if leg.commute_before:
                 commute_duration = self.get_commute_duration(flight.origin, is_departure=True)
                 commute_start = flight.departure_time - commute_duration
 
@@ -472,23 +1291,15 @@ class ICSGenerator:
                     'Commute & Airport',
                     commute_start,
                     flight.departure_time,
-                    origin_tz,
+                    leg.origin_tz.key,
                     f'Travel to {flight.origin} for flight {flight.flight_number}'
                 )
 
             # Add flight event
             self.add_flight_event(flight)
 
-            # Add "airport & commute" after flight (only if last leg or not connecting)
-            was_connection_from_previous = False
-            if not is_first_leg:
-                prev_flight = flights[i - 1]
-                if (prev_flight.destination == flight.origin and
-                    (flight.departure_time - prev_flight.arrival_time) < timedelta(hours=12)):
-                    was_connection_from_previous = True
-
-            if is_last_leg or not was_connection_from_previous:
-                dest_tz = self.get_timezone(flight.destination)
+            # Add "airport & commute" after flight (unless connecting to the next leg)
+            if leg.commute_after:
                 commute_duration = self.get_commute_duration(flight.destination, is_departure=False)
                 commute_end = flight.arrival_time + commute_duration
 
@@ -496,22 +1307,223 @@ class ICSGenerator:
                     'Airport & Commute',
                     flight.arrival_time,
                     commute_end,
-                    dest_tz,
+                    leg.destination_tz.key,
                     f'Travel from {flight.destination} after flight {flight.flight_number}'
                 )
 
+            yield leg
+
+    def to_ical(self):
+        """Serialize the calendar to ICS bytes, with each zone's VTIMEZONE once."""
+        events = [component for component in self.calendar.subcomponents
+                  if component.name != 'VTIMEZONE']
+        self.calendar.subcomponents = self.timezone_components() + events
+        return self.calendar.to_ical()
+
     def save(self, output_path):
         """Save calendar to ICS file."""
         with open(output_path, 'wb') as f:
-            f.write(self.calendar.to_ical())
+            f.write(self.to_ical())
+
+
+def find_batch_inputs(patterns):
+    """Expand directories and glob patterns into a sorted list of PDF paths."""
+    import glob
+
+    inputs = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            inputs.update(p for p in path.iterdir() if p.suffix.lower() == '.pdf')
+        else:
+            inputs.update(Path(p) for p in glob.glob(pattern))
+    return sorted(inputs)
+
+
+def batch_output_names(pdf_paths):
+    """
+    Get an ICS file name for each batch input
+
+    Inputs are named after their PDF, except where PDFs from different
+    directories share a name (e.g. a/itinerary.pdf and b/itinerary.pdf):
+    those keep their path relative to the inputs' common directory, so
+    they don't overwrite each other.
+
+    Args:
+        pdf_paths: PDF paths, as found by find_batch_inputs
+
+    Returns:
+        dict: PDF path to output path relative to the output directory
+    """
+    import os
+
+    stems = {}
+    for pdf_path in pdf_paths:
+        stems.setdefault(pdf_path.stem, []).append(pdf_path)
+
+    names = {}
+    for stem, paths in stems.items():
+        if len(paths) == 1:
+            names[paths[0]] = Path(f'{stem}.ics')
+            continue
+        root = os.path.commonpath([str(path.resolve().parent) for path in paths])
+        for path in paths:
+            names[path] = path.resolve().relative_to(root).with_suffix('.ics')
+    return names
+
+
+def _convert_batch_file(pdf_path, output_path=None, max_pages=MAX_PAGES, backend=None):
+    """
+    Parse one PDF for batch mode (runs in a worker process)
+
+    Writes the ICS file when output_path is given, otherwise returns the
+    parsed flights and hotels so they can be merged.
+    """
+    import time
+
+    started = time.perf_counter()
+    result = {'input': str(pdf_path), 'output': output_path}
+    try:
+        parser = TravelPDFParser(pdf_path, max_pages=max_pages, backend=backend)
+        flights = parser.parse_flights()
+        hotels = parser.parse_hotels()
+        result.update(
+            status='converted',
+            format=parser.format_name,
+            traveller=parser.parse_traveller() or Path(pdf_path).stem,
+            flights=len(flights),
+            hotels=len(hotels),
+            warnings=[diagnostic.message for diagnostic in parser.diagnostics]
+        )
+
+        if output_path:
+            from fast_ics_generator import FastICSGenerator
+            # Stream events straight to the file
+            FastICSGenerator().save(output_path, flights, hotels)
+        else:
+            result['segments'] = (flights, hotels)
+    except Exception as e:
+        result.update(status='failed', error=str(e))
+
+    result['seconds'] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def batch_main(argv):
+    """Convert many PDFs in parallel and write a JSON summary."""
+    import argparse
+    import json
+    import os
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from fast_ics_generator import FastICSGenerator
+
+    arg_parser = argparse.ArgumentParser(
+        prog='travel_to_ics.py --batch',
+        description='Convert directories or globs of travel PDFs to ICS files.'
+    )
+    arg_parser.add_argument('inputs', nargs='+', help='PDF files, directories or glob patterns')
+    arg_parser.add_argument('-o', '--output-dir', default='.', help='Directory for the ICS files')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                            help='Number of worker processes')
+    arg_parser.add_argument('--merge-by-traveller', action='store_true',
+                            help='Write one merged calendar per traveller instead of one per PDF')
+    arg_parser.add_argument('--summary', default=None,
+                            help='JSON summary path (default: <output-dir>/batch_summary.json)')
+    arg_parser.add_argument('--force', action='store_true',
+                            help='Convert inputs even if their ICS file is up to date')
+    arg_parser.add_argument('--max-pages', type=int, default=MAX_PAGES,
+                            help='Fail PDFs whose itinerary runs past this many pages')
+    arg_parser.add_argument('--backend', default=None,
+                            help="PDF text extraction backend, or 'auto' for the fastest installed "
+                                 "(default: PDF_BACKEND or pypdf2)")
+    args = arg_parser.parse_args(argv)
+    try:
+        resolve_backend(args.backend)
+    except ValueError as e:
+        arg_parser.error(str(e))
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    summary_path = args.summary or str(output_dir / 'batch_summary.json')
+
+    started = time.perf_counter()
+    files = []
+    pending = []
+    pdf_paths = find_batch_inputs(args.inputs)
+    output_names = batch_output_names(pdf_paths)
+    for pdf_path in pdf_paths:
+        if args.merge_by_traveller:
+            pending.append((pdf_path, None))
+            continue
+
+        output_path = output_dir / output_names[pdf_path]
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Resume: skip inputs whose ICS file is newer than the PDF
+        if (not args.force and output_path.exists()
+                and output_path.stat().st_mtime >= pdf_path.stat().st_mtime):
+            files.append({'input': str(pdf_path), 'output': str(output_path), 'status': 'skipped'})
+            continue
+        pending.append((pdf_path, str(output_path)))
+
+    print(f"Converting {len(pending)} PDF(s) with {args.jobs} worker(s)...")
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(executor.map(
+            _convert_batch_file, *zip(*pending), [args.max_pages] * len(pending),
+            [args.backend] * len(pending)
+        )) if pending else []
+
+    if args.merge_by_traveller:
+        # Group the parsed segments of every PDF by traveller
+        travellers = {}
+        for result in results:
+            if result['status'] == 'converted':
+                travellers.setdefault(result['traveller'], []).append(result)
+
+        for traveller, traveller_results in travellers.items():
+            output_path = output_dir / f"{re.sub(r'[^A-Za-z0-9_-]+', '_', traveller).strip('_')}.ics"
+            flights, hotels = [], []
+            for result in traveller_results:
+                result_flights, result_hotels = result.pop('segments')
+                flights.extend(result_flights)
+                hotels.extend(result_hotels)
+                result['output'] = str(output_path)
+
+            # Stream events straight to the file
+            FastICSGenerator().save(output_path, flights, hotels)
+
+    files.extend(results)
+    elapsed = time.perf_counter() - started
+    converted = [f for f in files if f['status'] == 'converted']
+    summary = {
+        'total_files': len(files),
+        'converted': len(converted),
+        'skipped': sum(1 for f in files if f['status'] == 'skipped'),
+        'failed': sum(1 for f in files if f['status'] == 'failed'),
+        'elapsed_seconds': round(elapsed, 4),
+        'files_per_second': round(len(converted) / elapsed, 2) if elapsed else None,
+        'files': files,
+    }
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n✓ Batch finished in {elapsed:.1f}s")
+    print(f"  - {summary['converted']} converted, {summary['skipped']} skipped, {summary['failed']} failed")
+    print(f"  - Summary written to {summary_path}")
+    return summary
 
 
 def main():
     """Main function to convert PDF to ICS."""
     import sys
 
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        summary = batch_main(sys.argv[2:])
+        sys.exit(1 if summary['failed'] else 0)
+
     if len(sys.argv) < 2:
         print("Usage: python travel_to_ics.py <pdf_file> [output_file]")
+        print("       python travel_to_ics.py --batch <dir|glob>... [-o OUTPUT_DIR] [-j JOBS]")
         print("\nThis script converts travel agent PDFs to ICS calendar files.")
         print("\nNote: The PDF parsing logic needs to be customized based on")
         print("your specific travel agent's PDF format. Please provide a sample")
@@ -523,9 +1535,11 @@ def main():
 
     # Parse PDF
     print(f"Parsing PDF: {pdf_path}")
-    parser = TravelPDFParser(pdf_path)
+    parser = TravelPDFParser(pdf_path, diagnostics=logging.INFO)
     flights = parser.parse_flights()
     hotels = parser.parse_hotels()
+    for diagnostic in parser.diagnostics:
+        print(f"{'⚠' if diagnostic.level >= logging.WARNING else '✓'} {diagnostic.message}")
 
     # Generate ICS
     print(f"\nGenerating ICS file: {output_path}")
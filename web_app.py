@@ -3,13 +3,14 @@
 Production-ready web frontend for Travel PDF to ICS Converter
 """
 
-from flask import Flask, render_template, request, send_file, flash, redirect, url_for
+from flask import Flask, render_template, request, flash, redirect, url_for, Response, stream_with_context
 import os
 from werkzeug.utils import secure_filename
-from travel_to_ics import TravelPDFParser
-from custom_ics_generator import CustomICSGenerator
+from fast_ics_generator import FastICSGenerator, start_stream
+from parse_pool import ParsePool, ParsePoolBusy, ParseTimeout
+from pdf_backends import resolve_backend
+from travel_to_ics import MAX_PAGES
 from pathlib import Path
-import tempfile
 import secrets
 
 app = Flask(__name__)
@@ -17,13 +18,21 @@ app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
 
 # Configuration
-UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'pdf'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# PDF parsing runs in a process pool so request threads stay responsive
+parse_pool = ParsePool(
+    processes=int(os.environ.get('PARSE_WORKERS', 2)),
+    timeout=int(os.environ.get('PARSE_TIMEOUT', 30)),
+    max_pages=int(os.environ.get('PARSE_MAX_PAGES', MAX_PAGES))
+)
+
+# Check PDF_BACKEND at startup instead of failing every upload
+resolve_backend()
+
 
 def allowed_file(filename):
     """Check if file extension is allowed."""
@@ -54,19 +63,13 @@ def upload_file():
         return redirect(url_for('index'))
 
     try:
-        # Save uploaded file
+        # Parse PDF straight from the upload
         filename = secure_filename(file.filename)
-        pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(pdf_path)
-
-        # Parse PDF
-        parser = TravelPDFParser(pdf_path)
-        flights = parser.parse_flights()
-        hotels = parser.parse_hotels()
+        warnings = []
+        flights, hotels = parse_pool.parse(file.read(), warnings=warnings)
 
         if not flights and not hotels:
             flash('No flights or hotels found in the PDF. Please check if the PDF format is compatible.', 'warning')
-            os.remove(pdf_path)
             return redirect(url_for('index'))
 
         # Get custom settings from form
@@ -86,40 +89,34 @@ def upload_file():
                 airport_times[f'{airport_code}_{direction}'] = request.form[key]
 
         # Generate ICS with custom settings
-        generator = CustomICSGenerator(
+        generator = FastICSGenerator(
             flight_color=flight_color,
             hotel_color=hotel_color,
             airport_times=airport_times
         )
-        generator.process_flights(flights)
-
-        for hotel in hotels:
-            generator.add_hotel_event(hotel)
-
-        # Save ICS file
         ics_filename = Path(filename).stem + '.ics'
-        ics_path = os.path.join(app.config['UPLOAD_FOLDER'], ics_filename)
-        generator.save(ics_path)
 
-        # Clean up PDF
-        os.remove(pdf_path)
+        # Render the start of the file now, so errors still get an error page
+        ics_stream = start_stream(generator.iter_ical(flights, hotels))
 
         # Show success message
         flash(f'Successfully converted! Found {len(flights)} flights and {len(hotels)} hotels.', 'success')
-
-        # Send file
-        return send_file(
-            ics_path,
-            as_attachment=True,
-            download_name=ics_filename,
-            mimetype='text/calendar'
+        for warning in warnings:
+            flash(f"Skipped: {warning['message']}", 'warning')
+
+        # Stream the rest of the file as events are rendered
+        return Response(
+            stream_with_context(ics_stream),
+            mimetype='text/calendar',
+            headers={'Content-Disposition': f'attachment; filename={ics_filename}'}
         )
 
+    except (ParsePoolBusy, ParseTimeout) as e:
+        flash(f'{str(e)}. Please try again in a moment.', 'warning')
+        return redirect(url_for('index'))
+
     except Exception as e:
         flash(f'Error processing file: {str(e)}', 'error')
-        # Clean up files on error
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
         return redirect(url_for('index'))
 
 
@@ -147,7 +144,7 @@ if __name__ == '__main__':
     print(f"🔒 Debug mode: {debug}")
     print(f"🔑 Secret key: {'Set' if app.secret_key else 'Not set (using default)'}")
     print("\n⚠️  For production, use a WSGI server like Gunicorn:")
-    print(f"   gunicorn -w 4 -b 0.0.0.0:{port} web_app_production:app")
+    print(f"   gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:{port} web_app_production:app")
     print("="*60 + "\n")
 
     app.run(debug=debug, host='0.0.0.0', port=port)
@@ -4,34 +4,103 @@ Simple web frontend for Travel PDF to ICS Converter
 ICS download only with customizable colors and commute times
 """
 
-from flask import Flask, render_template, request, send_file, flash, redirect, url_for, session
+from flask import Flask, render_template, request, send_file, flash, redirect, url_for, Response, stream_with_context, g
 import os
+import time
 from werkzeug.utils import secure_filename
-from travel_to_ics import TravelPDFParser
-from custom_ics_generator import CustomICSGenerator
+from fast_ics_generator import FastICSGenerator, start_stream
+from parse_cache import ParseCache
+from result_store import create_result_store, encode_itinerary, decode_itinerary
+from parse_pool import ParsePool, ParsePoolBusy, ParseTimeout
+from pdf_backends import resolve_backend
+from travel_to_ics import MAX_PAGES
+from conversion_jobs import JobStore, JobQueue
+from metrics import StageTimings, registry as metrics_registry
 from pathlib import Path
-import tempfile
 import secrets
-import pickle
 import uuid
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
 
 # Configuration
-UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'pdf'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# Add a Server-Timing header with per-stage durations to responses
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'False').lower() == 'true'
+
+# Parse results shared by all workers, so re-uploads skip PDF parsing
+parse_cache = ParseCache(os.environ.get('PARSE_CACHE_PATH'))
+
+# Parsed uploads awaiting preview/generate, kept server-side instead of in the cookie
+result_store = create_result_store(
+    os.environ.get('RESULT_STORE', 'sqlite'),
+    os.environ.get('RESULT_STORE_PATH')
+)
+
+# PDF parsing runs in a process pool so request threads stay responsive
+parse_pool = ParsePool(
+    processes=int(os.environ.get('PARSE_WORKERS', 2)),
+    timeout=int(os.environ.get('PARSE_TIMEOUT', 30)),
+    max_pages=int(os.environ.get('PARSE_MAX_PAGES', MAX_PAGES))
+)
+
+# Check PDF_BACKEND at startup instead of failing every upload
+resolve_backend()
+
+# Background conversion jobs, tracked on disk so any worker can report them
+job_store = JobStore(os.environ.get('JOB_STORE_PATH'))
+job_queue = JobQueue(job_store, parse_pool, cache_path=parse_cache.path)
+
 
 def allowed_file(filename):
     """Check if file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def get_airport_times(form):
+    """Get airport commute times from the settings form."""
+    airport_times = {}
+    for key in ['scl_before', 'scl_after', 'aep_before', 'aep_after',
+               'eze_before', 'eze_after', 'gru_before', 'gru_after',
+               'mex_before', 'mex_after', 'international_before', 'international_after']:
+        if key in form:
+            # Convert to uppercase for airport code
+            parts = key.split('_')
+            airport_code = parts[0].upper()
+            direction = parts[1]
+            airport_times[f'{airport_code}_{direction}'] = form[key]
+    return airport_times
+
+
+def load_upload(session_id):
+    """Get a parsed upload from the result store, or None if expired."""
+    with g.timings.stage('store'):
+        payload = result_store.get(session_id)
+    return decode_itinerary(payload) if payload else None
+
+
+@app.before_request
+def start_timings():
+    """Collect stage timings for this request."""
+    g.timings = StageTimings()
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def record_timings(response):
+    """Add the request's timings to the worker metrics."""
+    metrics_registry.record(g.timings)
+    metrics_registry.record_request(request.endpoint or 'unknown', response.status_code,
+                                    time.perf_counter() - g.started)
+    if SERVER_TIMING and g.timings.stages:
+        response.headers['Server-Timing'] = g.timings.server_timing()
+    return response
+
+
 @app.route('/')
 def index():
     """Main page with upload form."""
@@ -56,35 +125,40 @@ def upload_file():
         return redirect(url_for('index'))
 
     try:
-        # Save uploaded file
         filename = secure_filename(file.filename)
-        pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(pdf_path)
-
-        # Parse PDF
-        parser = TravelPDFParser(pdf_path)
-        flights = parser.parse_flights()
-        hotels = parser.parse_hotels()
-
-        # Clean up PDF
-        os.remove(pdf_path)
+        pdf_bytes = file.read()
+
+        # Reuse parse results for a PDF that was already uploaded
+        with g.timings.stage('cache'):
+            cache_key = parse_cache.key(pdf_bytes)
+            cached = parse_cache.get(cache_key)
+        if cached:
+            flights, hotels, warnings = cached
+            g.timings.count('cache_hits')
+        else:
+            # Parse PDF straight from the upload
+            warnings = []
+            flights, hotels = parse_pool.parse(pdf_bytes, timings=g.timings, warnings=warnings)
+            with g.timings.stage('cache'):
+                parse_cache.put(cache_key, flights, hotels, warnings)
 
         # Generate unique session ID
         session_id = str(uuid.uuid4())
 
-        # Store parsed data in session (serialize objects)
-        session[f'flights_{session_id}'] = pickle.dumps(flights)
-        session[f'hotels_{session_id}'] = pickle.dumps(hotels)
-        session[f'filename_{session_id}'] = filename
+        # Store parsed data server-side under the session ID
+        with g.timings.stage('store'):
+            result_store.put(session_id, encode_itinerary(flights, hotels, filename=filename,
+                                                          warnings=warnings))
 
         # Redirect to preview page
         return redirect(url_for('preview', session_id=session_id))
 
+    except (ParsePoolBusy, ParseTimeout) as e:
+        flash(f'{str(e)}. Please try again in a moment.', 'warning')
+        return redirect(url_for('index'))
+
     except Exception as e:
         flash(f'Error processing file: {str(e)}', 'error')
-        # Clean up files on error
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
         return redirect(url_for('index'))
 
 
@@ -92,20 +166,17 @@ def upload_file():
 def preview(session_id):
     """Show preview of parsed data."""
     try:
-        # Retrieve data from session
-        flights_data = session.get(f'flights_{session_id}')
-        hotels_data = session.get(f'hotels_{session_id}')
+        # Retrieve parsed data
+        upload = load_upload(session_id)
 
-        if not flights_data and not hotels_data:
+        if not upload:
             flash('Session expired. Please upload your PDF again.', 'warning')
             return redirect(url_for('index'))
 
-        flights = pickle.loads(flights_data) if flights_data else []
-        hotels = pickle.loads(hotels_data) if hotels_data else []
-
         return render_template('preview.html',
-                             flights=flights,
-                             hotels=hotels,
+                             flights=upload['flights'],
+                             hotels=upload['hotels'],
+                             warnings=upload.get('warnings', []),
                              session_id=session_id)
     except Exception as e:
         flash(f'Error loading preview: {str(e)}', 'error')
@@ -122,64 +193,50 @@ def generate_ics():
         return redirect(url_for('index'))
 
     try:
-        # Retrieve data from session
-        flights_data = session.get(f'flights_{session_id}')
-        hotels_data = session.get(f'hotels_{session_id}')
-        filename = session.get(f'filename_{session_id}', 'travel.pdf')
+        # Retrieve parsed data
+        upload = load_upload(session_id)
 
-        if not flights_data and not hotels_data:
+        if not upload:
             flash('Session expired. Please upload your PDF again.', 'warning')
             return redirect(url_for('index'))
 
-        flights = pickle.loads(flights_data) if flights_data else []
-        hotels = pickle.loads(hotels_data) if hotels_data else []
+        flights = upload['flights']
+        hotels = upload['hotels']
+        filename = upload.get('filename', 'travel.pdf')
 
         # Get custom settings from form
         flight_color = request.form.get('flight_color', '11')
         hotel_color = request.form.get('hotel_color', '6')
 
         # Get airport commute times
-        airport_times = {}
-        for key in ['scl_before', 'scl_after', 'aep_before', 'aep_after',
-                   'eze_before', 'eze_after', 'gru_before', 'gru_after',
-                   'mex_before', 'mex_after', 'international_before', 'international_after']:
-            if key in request.form:
-                # Convert to uppercase for airport code
-                parts = key.split('_')
-                airport_code = parts[0].upper()
-                direction = parts[1]
-                airport_times[f'{airport_code}_{direction}'] = request.form[key]
+        airport_times = get_airport_times(request.form)
 
         # Generate ICS with custom settings
-        generator = CustomICSGenerator(
+        generator = FastICSGenerator(
             flight_color=flight_color,
             hotel_color=hotel_color,
             airport_times=airport_times
         )
-        generator.process_flights(flights)
-
-        for hotel in hotels:
-            generator.add_hotel_event(hotel)
-
-        # Save ICS file
         ics_filename = Path(filename).stem + '.ics'
-        ics_path = os.path.join(app.config['UPLOAD_FOLDER'], ics_filename)
-        generator.save(ics_path)
 
-        # Clean up session data
-        session.pop(f'flights_{session_id}', None)
-        session.pop(f'hotels_{session_id}', None)
-        session.pop(f'filename_{session_id}', None)
+        # Stream the file as events are rendered; the ics stage is recorded
+        # in the worker metrics once the stream ends. The start of the file
+        # is rendered now, so errors still get the error page below.
+        ics_stream = start_stream(metrics_registry.timed_stream(
+            'ics', generator.iter_ical(flights, hotels),
+            counters=lambda: {'events': generator.events_written}
+        ))
+
+        # Clean up stored data
+        result_store.delete(session_id)
 
         # Show success message
         flash(f'Successfully converted! Found {len(flights)} flights and {len(hotels)} hotels.', 'success')
 
-        # Send file
-        return send_file(
-            ics_path,
-            as_attachment=True,
-            download_name=ics_filename,
-            mimetype='text/calendar'
+        return Response(
+            stream_with_context(ics_stream),
+            mimetype='text/calendar',
+            headers={'Content-Disposition': f'attachment; filename={ics_filename}'}
         )
 
     except Exception as e:
@@ -187,12 +244,75 @@ def generate_ics():
         return redirect(url_for('index'))
 
 
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a conversion job and return its id immediately."""
+    file = request.files.get('file')
+
+    if not file or file.filename == '':
+        return {'error': 'No file selected'}, 400
+
+    if not allowed_file(file.filename):
+        return {'error': 'Invalid file type. Please upload a PDF file.'}, 400
+
+    settings = {
+        'flight_color': request.form.get('flight_color', '11'),
+        'hotel_color': request.form.get('hotel_color', '6'),
+        'airport_times': get_airport_times(request.form),
+    }
+    job_id = job_store.create(file.read(), secure_filename(file.filename), settings)
+    job_queue.submit(job_id)
+
+    return {
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('job_status', job_id=job_id),
+        'ics_url': url_for('job_ics', job_id=job_id),
+    }, 202
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report a conversion job's progress."""
+    status = job_store.get(job_id)
+    if status is None:
+        return {'error': 'Job not found'}, 404
+
+    status.pop('settings', None)
+    return status, 200
+
+
+@app.route('/jobs/<job_id>/ics')
+def job_ics(job_id):
+    """Download the ICS file of a finished conversion job."""
+    status = job_store.get(job_id)
+    if status is None:
+        return {'error': 'Job not found'}, 404
+
+    if status['status'] != 'done':
+        return {'error': 'Job is not finished', 'status': status['status']}, 409
+
+    return send_file(
+        job_store.ics_path(job_id),
+        as_attachment=True,
+        download_name=Path(status['filename']).stem + '.ics',
+        mimetype='text/calendar'
+    )
+
+
 @app.route('/about')
 def about():
     """About page with instructions."""
     return render_template('about.html')
 
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics of the worker process answering the scrape."""
+    return Response(metrics_registry.render(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/health')
 def health():
     """Health check endpoint for deployment monitoring."""
@@ -202,7 +322,8 @@ def health():
         'features': {
             'ics_download': True,
             'customization': True
-        }
+        },
+        'worker': metrics_registry.snapshot()
     }, 200
 
 
@@ -217,7 +338,7 @@ if __name__ == '__main__':
     print(f"\n🌐 Running on port: {port}")
     print(f"🔒 Debug mode: {debug}")
     print("\n⚠️  For production, use a WSGI server like Gunicorn:")
-    print(f"   gunicorn -w 4 -b 0.0.0.0:{port} web_app_simple:app")
+    print(f"   gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:{port} web_app_simple:app")
     print("="*60 + "\n")
 
     app.run(debug=debug, host='0.0.0.0', port=port)
@@ -6,11 +6,12 @@ Production-ready web frontend for Travel PDF to ICS Converter
 from flask import Flask, render_template, request, send_file, flash, redirect, url_for, session
 import os
 from werkzeug.utils import secure_filename
-from travel_to_ics import TravelPDFParser
-from custom_ics_generator import CustomICSGenerator
+from travel_to_ics import TravelPDFParser, FlightInfo, HotelInfo
+from fast_ics_generator import FastICSGenerator
 from google_calendar_integration import GoogleCalendarIntegration
+from calendar_sync import CalendarSync, SyncState, itinerary_events, trip_key
 from pathlib import Path
-import tempfile
+import io
 import secrets
 
 app = Flask(__name__)
@@ -18,13 +19,14 @@ app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
 
 # Configuration
-UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'pdf'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# Last pushed Google Calendar state per user and trip
+sync_state = SyncState(os.environ.get('CALENDAR_SYNC_PATH'))
+
 
 def allowed_file(filename):
     """Check if file extension is allowed."""
@@ -55,19 +57,14 @@ def upload_file():
         return redirect(url_for('index'))
 
     try:
-        # Save uploaded file
+        # Parse PDF straight from the upload
         filename = secure_filename(file.filename)
-        pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(pdf_path)
-
-        # Parse PDF
-        parser = TravelPDFParser(pdf_path)
+        parser = TravelPDFParser(file.read())
         flights = parser.parse_flights()
         hotels = parser.parse_hotels()
 
         if not flights and not hotels:
             flash('No flights or hotels found in the PDF. Please check if the PDF format is compatible.', 'warning')
-            os.remove(pdf_path)
             return redirect(url_for('index'))
 
         # Get custom settings from form
@@ -87,49 +84,19 @@ def upload_file():
                 direction = parts[1]
                 airport_times[f'{airport_code}_{direction}'] = request.form[key]
 
-        # Store data in session for Google Calendar flow (serialize datetime objects)
-        flights_serialized = []
-        for f in flights:
-            f_dict = {
-                'flight_number': f.flight_number,
-                'origin': f.origin,
-                'destination': f.destination,
-                'departure_time': f.departure_time.isoformat(),
-                'arrival_time': f.arrival_time.isoformat(),
-                'reservation_code': f.reservation_code,
-                'ticket_number': f.ticket_number
-            }
-            flights_serialized.append(f_dict)
-
-        hotels_serialized = []
-        for h in hotels:
-            h_dict = {
-                'name': h.name,
-                'checkin_date': h.checkin_date.isoformat(),
-                'checkout_date': h.checkout_date.isoformat(),
-                'confirmation_number': h.confirmation_number,
-                'address': h.address,
-                'phone': h.phone,
-                'details': h.details,
-                'timezone': h.timezone
-            }
-            hotels_serialized.append(h_dict)
-
-        session['flights'] = flights_serialized
-        session['hotels'] = hotels_serialized
+        # Store data in session for Google Calendar flow (compact record encoding)
+        session['flights'] = FlightInfo.encode_many(flights)
+        session['hotels'] = HotelInfo.encode_many(hotels)
         session['flight_color'] = flight_color
         session['hotel_color'] = hotel_color
         session['airport_times'] = airport_times
 
-        # Clean up PDF
-        os.remove(pdf_path)
-
         if output_method == 'google':
             # Redirect to Google OAuth
             return redirect(url_for('google_auth'))
         else:
             # Generate ICS file
-            generator = CustomICSGenerator(
+            generator = FastICSGenerator(
                 flight_color=flight_color,
                 hotel_color=hotel_color,
                 airport_times=airport_times
@@ -139,17 +106,16 @@ def upload_file():
             for hotel in hotels:
                 generator.add_hotel_event(hotel)
 
-            # Save ICS file
+            # Serialize ICS in memory
             ics_filename = Path(filename).stem + '.ics'
-            ics_path = os.path.join(app.config['UPLOAD_FOLDER'], ics_filename)
-            generator.save(ics_path)
+            ics_data = generator.to_ical()
 
             # Show success message
             flash(f'Successfully converted! Found {len(flights)} flights and {len(hotels)} hotels.', 'success')
 
             # Send file
             return send_file(
-                ics_path,
+                io.BytesIO(ics_data),
                 as_attachment=True,
                 download_name=ics_filename,
                 mimetype='text/calendar'
@@ -157,9 +123,6 @@ def upload_file():
 
     except Exception as e:
         flash(f'Error processing file: {str(e)}', 'error')
-        # Clean up files on error
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
         return redirect(url_for('index'))
 
 
@@ -223,9 +186,6 @@ def google_callback():
         gcal.handle_oauth_callback(authorization_response, state, redirect_uri)
 
         # Retrieve stored data from session
-        from travel_to_ics import FlightInfo, HotelInfo
-        from datetime import datetime
-
         flights_data = session.get('flights', [])
         hotels_data = session.get('hotels', [])
         flight_color = session.get('flight_color', '11')
@@ -233,81 +193,12 @@ def google_callback():
         airport_times = session.get('airport_times', {})
 
         # Reconstruct objects
-        flights = []
-        for f_data in flights_data:
-            flight = FlightInfo()
-            flight.flight_number = f_data['flight_number']
-            flight.origin = f_data['origin']
-            flight.destination = f_data['destination']
-            flight.departure_time = datetime.fromisoformat(f_data['departure_time'])
-            flight.arrival_time = datetime.fromisoformat(f_data['arrival_time'])
-            flight.reservation_code = f_data['reservation_code']
-            flight.ticket_number = f_data.get('ticket_number')
-            flights.append(flight)
-
-        hotels = []
-        for h_data in hotels_data:
-            hotel = HotelInfo()
-            hotel.name = h_data['name']
-            hotel.checkin_date = datetime.fromisoformat(h_data['checkin_date'])
-            hotel.checkout_date = datetime.fromisoformat(h_data['checkout_date'])
-            hotel.confirmation_number = h_data.get('confirmation_number')
-            hotel.address = h_data.get('address')
-            hotel.phone = h_data.get('phone')
-            hotel.details = h_data.get('details')
-            hotel.timezone = h_data.get('timezone', 'UTC')
-            hotels.append(hotel)
-
-        # Create events in Google Calendar
-        events_created = 0
-
-        # Create flight events with commutes
-        generator = CustomICSGenerator(
-            flight_color=flight_color,
-            hotel_color=hotel_color,
-            airport_times=airport_times
-        )
-
-        # Process flights to get commute info
-        processed_flights = generator._prepare_flights_with_commutes(flights)
-
-        for flight_data in processed_flights:
-            flight = flight_data['flight']
-
-            # Create commute before (if needed)
-            if flight_data.get('commute_before'):
-                commute = flight_data['commute_before']
-                gcal.create_commute_event(
-                    title=commute['title'],
-                    start_datetime=commute['start'],
-                    end_datetime=commute['end'],
-                    timezone=commute['timezone'],
-                    description=commute.get('description', ''),
-                    color_id=flight_color
-                )
-                events_created += 1
-
-            # Create flight event
-            gcal.create_flight_event(flight, color_id=flight_color)
-            events_created += 1
-
-            # Create commute after (if needed)
-            if flight_data.get('commute_after'):
-                commute = flight_data['commute_after']
-                gcal.create_commute_event(
-                    title=commute['title'],
-                    start_datetime=commute['start'],
-                    end_datetime=commute['end'],
-                    timezone=commute['timezone'],
-                    description=commute.get('description', ''),
-                    color_id=flight_color
-                )
-                events_created += 1
-
-        # Create hotel events
-        for hotel in hotels:
-            gcal.create_hotel_event(hotel, color_id=hotel_color)
-            events_created += 1
+        flights = FlightInfo.decode_many(flights_data)
+        hotels = HotelInfo.decode_many(hotels_data)
+
+        # Sync events to Google Calendar (only changes since the last push)
+        events = itinerary_events(gcal, flights, hotels, flight_color, hotel_color, airport_times)
+        result = CalendarSync(gcal, sync_state).sync(trip_key(flights, hotels), events)
 
         # Clear session data
         session.pop('flights', None)
@@ -317,7 +208,11 @@ def google_callback():
         session.pop('airport_times', None)
         session.pop('oauth_state', None)
 
-        flash(f'✅ Successfully created {events_created} events in your Google Calendar!', 'success')
+        if result['failed']:
+            failed_summaries = ', '.join(item['summary'] for item in result['failed'])
+            flash(f'⚠️ Could not sync {len(result["failed"])} events: {failed_summaries}', 'warning')
+        flash(f'✅ Google Calendar updated: {result["inserted"]} created, {result["updated"]} updated, '
+              f'{result["deleted"]} removed, {result["unchanged"]} unchanged.', 'success')
         return redirect(url_for('index'))
 
     except Exception as e: